@@ -1,104 +1,209 @@
+import argparse
+import os
 import sqlite3
 import json
-
-def inspect_database():
-    conn = sqlite3.connect('./parliament_votes.db')
+from itertools import groupby
+
+try:
+    import orjson
+except ImportError:  # optional, only speeds up writing the report
+    orjson = None
+
+DB_PATH = './parliament_votes.db'
+OUTPUT_PATH = 'database_inspection.json'
+
+def database_fingerprint(db_path=DB_PATH):
+    """Identify a version of the database file by its modification time and size."""
+    stat = os.stat(db_path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+def load_saved_inspection(fingerprint):
+    """Return the saved inspection if it was made from the same database file, else None."""
+    try:
+        with open(OUTPUT_PATH) as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if saved.get('metadata', {}).get('fingerprint') != fingerprint:
+        return None
+    return saved
+
+def configure_connection(conn):
+    """Tune a connection for the read-only metadata scan."""
+    # Map the file (256 MB) and use a 64 MB page cache, temp b-trees stay in memory
+    conn.executescript("""
+        PRAGMA mmap_size = 268435456;
+        PRAGMA cache_size = -65536;
+        PRAGMA temp_store = MEMORY;
+        PRAGMA trusted_schema = OFF;
+    """)
+
+def inspect_database(force=False, exact_counts=False):
+    # Skip the whole scan when the database did not change since the last report
+    fingerprint = database_fingerprint()
+    saved = None if force else load_saved_inspection(fingerprint)
+    if saved is not None:
+        print(f"Database unchanged since the last inspection, report from '{OUTPUT_PATH}'\n")
+        print_inspection(saved)
+        return saved
+
+    # The inspection never writes, open the file read-only
+    conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+    configure_connection(conn)
     cursor = conn.cursor()
 
-    results = {}
+    # One read transaction for the whole scan: a single lock and a consistent snapshot
+    cursor.execute("BEGIN DEFERRED")
 
-    print("=== DATABASE INSPECTION RESULTS ===\n")
+    results = {'metadata': {'db_path': DB_PATH, 'fingerprint': fingerprint}}
 
     # 1. Get all table names
-    print("1. ALL TABLES:")
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name;")
     tables = cursor.fetchall()
     table_names = [table[0] for table in tables]
     results['tables'] = table_names
-    for table in table_names:
-        print(f"   - {table}")
-    print()
 
-    # 2. Get schema for each table
-    print("2. TABLE SCHEMAS:")
+    # 2. Get schema and columns for every table in one go
     results['schemas'] = {}
-    cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='table' ORDER BY name;")
-    schemas = cursor.fetchall()
-    for name, sql in schemas:
-        print(f"\n--- {name} ---")
-        print(sql)
-        results['schemas'][name] = sql
-    print()
-
-    # 3. Get column info for each table
-    print("3. COLUMN DETAILS:")
     results['columns'] = {}
-    for table in table_names:
+    cursor.execute("""
+        SELECT m.name, m.sql, p.cid, p.name, p.type, p."notnull", p.dflt_value, p.pk
+        FROM sqlite_master m JOIN pragma_table_info(m.name) p
+        WHERE m.type='table'
+        ORDER BY m.name, p.cid;
+    """)
+    for name, sql, *column in cursor.fetchall():
+        if name not in results['schemas']:
+            results['schemas'][name] = sql
+            results['columns'][name] = []
+        results['columns'][name].append(tuple(column))
+
+    # 4. Get row counts, approximated from the ANALYZE statistics unless exact
+    # counts are asked for. row_count_source tells the estimates from real counts
+    results['row_counts'] = {}
+    results['row_count_source'] = {}
+    estimates = {}
+    if not exact_counts:
         try:
-            cursor.execute(f"PRAGMA table_info({table});")
-            columns = cursor.fetchall()
-            results['columns'][table] = columns
-            print(f"\n--- {table} columns ---")
-            for col in columns:
-                print(f"   {col[1]} ({col[2]}) - PK: {col[5]}, NotNull: {col[3]}")
-        except Exception as e:
-            print(f"Error getting columns for {table}: {e}")
-    print()
+            cursor.execute("SELECT tbl, MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 GROUP BY tbl")
+            estimates = dict(cursor.fetchall())
+        except sqlite3.OperationalError:
+            pass  # never analyzed
 
-    # 4. Get row counts
-    print("4. ROW COUNTS:")
-    results['row_counts'] = {}
+    # Each table on its own, one that can't be counted doesn't lose the others
     for table in table_names:
+        if table in estimates:
+            results['row_counts'][table] = estimates[table]
+            results['row_count_source'][table] = 'sqlite_stat1'
+            continue
         try:
-            cursor.execute(f"SELECT COUNT(*) FROM {table};")
-            count = cursor.fetchone()[0]
-            results['row_counts'][table] = count
-            print(f"   {table}: {count:,} rows")
-        except Exception as e:
-            print(f"Error counting {table}: {e}")
-    print()
+            cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            results['row_counts'][table] = cursor.fetchone()[0]
+            results['row_count_source'][table] = 'count'
+        except sqlite3.Error as e:
+            print(f"Error counting rows of {table}: {e}")
 
     # 5. Get sample data
-    print("5. SAMPLE DATA (first 2 rows):")
     results['samples'] = {}
     for table in table_names:
         try:
             cursor.execute(f"SELECT * FROM {table} LIMIT 2;")
             rows = cursor.fetchall()
 
-            # Get column names
-            cursor.execute(f"PRAGMA table_info({table});")
-            columns = [col[1] for col in cursor.fetchall()]
+            # Column names come from the table info fetched above
+            columns = [col[1] for col in results['columns'].get(table, [])]
 
             results['samples'][table] = {
                 'columns': columns,
                 'rows': rows
             }
-
-            print(f"\n--- {table} sample ---")
-            print("Columns:", ", ".join(columns))
-            for i, row in enumerate(rows):
-                print(f"Row {i+1}:", row)
         except Exception as e:
             print(f"Error sampling {table}: {e}")
 
     # 6. Check for indexes
-    print("\n6. INDEXES:")
     cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='index' AND sql IS NOT NULL;")
-    indexes = cursor.fetchall()
-    results['indexes'] = indexes
-    for name, sql in indexes:
-        print(f"   {name}: {sql}")
-
+    results['indexes'] = cursor.fetchall()
+
+    # 7. Get foreign keys of every table in one go
+    cursor.execute("""
+        SELECT m.name, f."from", f."table", f."to"
+        FROM sqlite_master m JOIN pragma_foreign_key_list(m.name) f
+        WHERE m.type='table'
+        ORDER BY m.name, f.id, f.seq;
+    """)
+    results['foreign_keys'] = {}
+    for name, fks in groupby(cursor.fetchall(), key=lambda fk: fk[0]):
+        results['foreign_keys'][name] = [fk[1:] for fk in fks]
+
+    cursor.execute("COMMIT")
     conn.close()
 
+    print_inspection(results)
+
     # Save to JSON file for easy sharing
-    with open('database_inspection.json', 'w') as f:
-        json.dump(results, f, indent=2, default=str)
+    if orjson is not None:
+        with open(OUTPUT_PATH, 'wb') as f:
+            f.write(orjson.dumps(results, default=str, option=orjson.OPT_INDENT_2))
+    else:
+        with open(OUTPUT_PATH, 'w') as f:
+            json.dump(results, f, indent=2, default=str)
 
     print(f"\n=== INSPECTION COMPLETE ===")
-    print("Results saved to 'database_inspection.json'")
+    print(f"Results saved to '{OUTPUT_PATH}'")
     print("\nYou can copy this entire output to share the database structure!")
 
+    # Callers reuse the results instead of inspecting again
+    return results
+
+def print_inspection(results):
+    """Print an inspection, fresh or loaded from the saved report."""
+    print("=== DATABASE INSPECTION RESULTS ===\n")
+
+    print("1. ALL TABLES:")
+    for table in results['tables']:
+        print(f"   - {table}")
+    print()
+
+    print("2. TABLE SCHEMAS:")
+    for name, sql in results['schemas'].items():
+        print(f"\n--- {name} ---")
+        print(sql)
+    print()
+
+    print("3. COLUMN DETAILS:")
+    for table in results['tables']:
+        print(f"\n--- {table} columns ---")
+        for col in results['columns'].get(table, []):
+            print(f"   {col[1]} ({col[2]}) - PK: {col[5]}, NotNull: {col[3]}")
+    print()
+
+    print("4. ROW COUNTS (~ estimated from ANALYZE statistics):")
+    sources = results.get('row_count_source', {})
+    for table, count in results['row_counts'].items():
+        approximate = "~" if sources.get(table) == 'sqlite_stat1' else ""
+        print(f"   {table}: {approximate}{count:,} rows")
+    print()
+
+    print("5. SAMPLE DATA (first 2 rows):")
+    for table, sample in results['samples'].items():
+        print(f"\n--- {table} sample ---")
+        print("Columns:", ", ".join(sample['columns']))
+        for i, row in enumerate(sample['rows']):
+            print(f"Row {i+1}:", tuple(row))
+
+    print("\n6. INDEXES:")
+    for name, sql in results['indexes']:
+        print(f"   {name}: {sql}")
+
+    print("\n7. FOREIGN KEYS:")
+    for name, fks in results['foreign_keys'].items():
+        print(f"\n--- {name} ---")
+        for from_column, to_table, to_column in fks:
+            print(f"   {from_column} -> {to_table}.{to_column}")
+
 if __name__ == "__main__":
-    inspect_database()
+    parser = argparse.ArgumentParser(description="Print the parliament database's schema, counts and samples.")
+    parser.add_argument("--force", action="store_true", help="inspect again even if the database file is unchanged")
+    parser.add_argument("--exact-counts", action="store_true", help="count every table's rows instead of using the ANALYZE statistics")
+    args = parser.parse_args()
+    inspect_database(force=args.force, exact_counts=args.exact_counts)
@@ -5,273 +5,551 @@ Scrapes European Parliament voting data and stores it in a database for AI agent
 """
 
 import os
-import requests
-import pandas as pd
+import csv
+import gzip
+import io
+import importlib.util
+import httpx
 import sqlite3
 import logging
-from typing import Dict, Optional
+import shutil
 import tempfile
+import threading
+from typing import BinaryIO, Dict, Optional
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Release files downloaded in parallel
+DOWNLOAD_WORKERS = 6
+
+# HTTP/2 lets the parallel downloads share one connection, needs the optional h2 package
+HTTP2 = importlib.util.find_spec('h2') is not None
+
+# Rows handed to executemany at once while streaming a CSV
+BATCH_SIZE = 10_000
+
+# Rows bound to a single multi-row INSERT, sqlite's default limit for a VALUES list
+ROWS_PER_INSERT = 500
+
+# CSV spelling of booleans, stored as 0/1 in sqlite
+BOOLEAN_VALUES = {'True': 1, 'False': 0, 'true': 1, 'false': 0}
+
+TableSchema = namedtuple('TableSchema', 'columns constraints create_sql')
+
+def _table(name: str, columns: Dict[str, str], constraints: tuple = ()) -> TableSchema:
+    """Describe a table, with its CREATE TABLE statement built once at import time."""
+    create_sql = f"CREATE TABLE {name} (\n"
+    create_sql += ",\n".join(f"{column} {definition}" for column, definition in columns.items())
+    if constraints:
+        create_sql += ",\n" + ",\n".join(constraints)
+    create_sql += "\n)"
+
+    # Tables with a composite primary key are stored clustered by it,
+    # instead of a rowid B-tree plus a separate primary key index
+    if any(constraint.startswith('PRIMARY KEY') for constraint in constraints):
+        create_sql += " WITHOUT ROWID"
+
+    return TableSchema(columns, constraints, create_sql)
+
+# Expected CSV files and their schemas
+_TABLES = {
+    'members': _table('members', {
+        'id': 'INTEGER PRIMARY KEY',
+        'first_name': 'TEXT',
+        'last_name': 'TEXT',
+        'country_code': 'TEXT',
+        'date_of_birth': 'DATE',
+        'email': 'TEXT',
+        'facebook': 'TEXT',
+        'twitter': 'TEXT',
+    }, (
+        'FOREIGN KEY (country_code) REFERENCES countries(code)',
+    )),
+    'countries': _table('countries', {
+        'code': 'TEXT PRIMARY KEY',
+        'iso_alpha_2': 'TEXT',
+        'label': 'TEXT',
+    }),
+    'groups': _table('groups', {
+        'code': 'TEXT PRIMARY KEY',
+        'official_label': 'TEXT',
+        'label': 'TEXT',
+        'short_label': 'TEXT',
+    }),
+    'group_memberships': _table('group_memberships', {
+        'member_id': 'INTEGER',
+        'group_code': 'TEXT',
+        'term': 'INTEGER',
+        'start_date': 'DATE',
+        'end_date': 'DATE',
+    }, (
+        'FOREIGN KEY (member_id) REFERENCES members(id)',
+        'FOREIGN KEY (group_code) REFERENCES groups(code)',
+    )),
+    'votes': _table('votes', {
+        'id': 'INTEGER PRIMARY KEY',
+        'timestamp': 'DATETIME',
+        'display_title': 'TEXT',
+        'reference': 'TEXT',
+        'description': 'TEXT',
+        'is_main': 'BOOLEAN',
+        'procedure_reference': 'TEXT',
+        'procedure_title': 'TEXT',
+        'procedure_type': 'TEXT',
+        'procedure_stage': 'TEXT',
+        'count_for': 'INTEGER',
+        'count_against': 'INTEGER',
+        'count_abstention': 'INTEGER',
+        'count_did_not_vote': 'INTEGER',
+        'result': 'TEXT',
+    }),
+    'member_votes': _table('member_votes', {
+        'vote_id': 'INTEGER',
+        'member_id': 'INTEGER',
+        'position': 'TEXT',
+        'country_code': 'TEXT',
+        'group_code': 'TEXT',
+    }, (
+        'PRIMARY KEY (vote_id, member_id)',
+        'FOREIGN KEY (vote_id) REFERENCES votes(id)',
+        'FOREIGN KEY (member_id) REFERENCES members(id)',
+    )),
+    'eurovoc_concepts': _table('eurovoc_concepts', {
+        'id': 'TEXT PRIMARY KEY',
+        'label': 'TEXT',
+    }),
+    'eurovoc_concept_votes': _table('eurovoc_concept_votes', {
+        'vote_id': 'INTEGER',
+        'eurovoc_concept_id': 'TEXT',
+    }, (
+        'FOREIGN KEY (vote_id) REFERENCES votes(id)',
+        'FOREIGN KEY (eurovoc_concept_id) REFERENCES eurovoc_concepts(id)',
+    )),
+    'oeil_subjects': _table('oeil_subjects', {
+        'code': 'TEXT PRIMARY KEY',
+        'label': 'TEXT',
+    }),
+    'oeil_subject_votes': _table('oeil_subject_votes', {
+        'vote_id': 'INTEGER',
+        'oeil_subject_code': 'TEXT',
+    }, (
+        'FOREIGN KEY (vote_id) REFERENCES votes(id)',
+        'FOREIGN KEY (oeil_subject_code) REFERENCES oeil_subjects(code)',
+    )),
+    'geo_areas': _table('geo_areas', {
+        'code': 'TEXT PRIMARY KEY',
+        'label': 'TEXT',
+        'iso_alpha_2': 'TEXT',
+    }),
+    'geo_area_votes': _table('geo_area_votes', {
+        'vote_id': 'INTEGER',
+        'geo_area_code': 'TEXT',
+    }, (
+        'FOREIGN KEY (vote_id) REFERENCES votes(id)',
+        'FOREIGN KEY (geo_area_code) REFERENCES geo_areas(code)',
+    )),
+    'committees': _table('committees', {
+        'code': 'TEXT PRIMARY KEY',
+        'label': 'TEXT',
+        'abbreviation': 'TEXT',
+    }),
+    'responsible_committee_votes': _table('responsible_committee_votes', {
+        'vote_id': 'INTEGER',
+        'committee_code': 'TEXT',
+    }, (
+        'FOREIGN KEY (vote_id) REFERENCES votes(id)',
+        'FOREIGN KEY (committee_code) REFERENCES committees(code)',
+    )),
+}
+
+# Creation and load order - parent tables first, then children
+TABLE_ORDER = (
+    # Reference tables first (no dependencies)
+    'countries',
+    'groups',
+    'committees',
+    'eurovoc_concepts',
+    'oeil_subjects',
+    'geo_areas',
+
+    # Core entities
+    'members',  # depends on countries
+    'votes',    # no dependencies
+
+    # Junction/relationship tables (depend on core entities)
+    'group_memberships',           # depends on members, groups
+    'member_votes',               # depends on members, votes
+    'eurovoc_concept_votes',      # depends on votes, eurovoc_concepts
+    'oeil_subject_votes',         # depends on votes, oeil_subjects
+    'geo_area_votes',             # depends on votes, geo_areas
+    'responsible_committee_votes' # depends on votes, committees
+)
+
+TABLES_WITH_FKS = ('members', 'group_memberships', 'member_votes', 'eurovoc_concept_votes',
+                   'oeil_subject_votes', 'geo_area_votes', 'responsible_committee_votes')
+
+# Indexes for common queries
+INDEXES = (
+    # member_votes is stored WITHOUT ROWID clustered on (vote_id, member_id), so the per-vote side needs no index.
+    # These also carry position, enough to answer member and country/group tallies from the index alone
+    "CREATE INDEX IF NOT EXISTS idx_member_votes_member_id ON member_votes(member_id, position)",
+    "CREATE INDEX IF NOT EXISTS idx_member_votes_country_group ON member_votes(country_code, group_code, position)",
+    # get_member_voting_history looks MEPs up by name, case insensitive
+    "CREATE INDEX IF NOT EXISTS idx_members_last_name ON members(last_name COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS idx_votes_timestamp ON votes(timestamp)",
+    # The agent's own SQL filters procedure_type without is_main, the partial index can't serve it
+    "CREATE INDEX IF NOT EXISTS idx_votes_procedure_type ON votes(procedure_type)",
+    # Partial indexes, most lookups only care about the main votes
+    "CREATE INDEX IF NOT EXISTS idx_votes_procedure_type_main ON votes(procedure_type) WHERE is_main = 1",
+    "CREATE INDEX IF NOT EXISTS idx_votes_main_timestamp ON votes(timestamp) WHERE is_main = 1",
+    "CREATE INDEX IF NOT EXISTS idx_group_memberships_member_id ON group_memberships(member_id)",
+    "CREATE INDEX IF NOT EXISTS idx_group_memberships_group_code ON group_memberships(group_code)",
+    "CREATE INDEX IF NOT EXISTS idx_eurovoc_concept_votes_vote_id ON eurovoc_concept_votes(vote_id, eurovoc_concept_id)",
+    "CREATE INDEX IF NOT EXISTS idx_eurovoc_concept_votes_concept_id ON eurovoc_concept_votes(eurovoc_concept_id, vote_id)",
+    "CREATE INDEX IF NOT EXISTS idx_oeil_subject_votes_vote_id ON oeil_subject_votes(vote_id)",
+    "CREATE INDEX IF NOT EXISTS idx_geo_area_votes_vote_id ON geo_area_votes(vote_id)",
+    "CREATE INDEX IF NOT EXISTS idx_responsible_committee_votes_vote_id ON responsible_committee_votes(vote_id)"
+)
+
+# Pre-aggregated tables for the agent's most common analyses, rebuilt after every load
+SUMMARY_TABLES = {
+    'mv_controversial_votes': """
+        SELECT id, display_title, procedure_title, timestamp, count_for, count_against,
+               ABS(count_for - count_against) AS margin,
+               count_for + count_against + count_abstention AS total,
+               ABS(count_for - count_against) * 1.0 / NULLIF(count_for + count_against, 0) AS margin_ratio
+        FROM votes
+        WHERE count_for > 0 AND count_against > 0
+    """,
+    'mv_topic_trends': """
+        SELECT ecv.eurovoc_concept_id, ec.label, strftime('%Y', v.timestamp) AS year,
+               COUNT(*) AS vote_count,
+               SUM(v.count_for) AS count_for,
+               SUM(v.count_against) AS count_against,
+               SUM(v.count_abstention) AS count_abstention
+        FROM eurovoc_concept_votes ecv
+        JOIN votes v ON v.id = ecv.vote_id
+        JOIN eurovoc_concepts ec ON ec.id = ecv.eurovoc_concept_id
+        GROUP BY ecv.eurovoc_concept_id, ec.label, year
+    """,
+    # per vote, how many MEPs of each group / country took each position
+    'mv_group_positions': """
+        SELECT mv.vote_id, v.timestamp, mv.group_code, mv.position, COUNT(*) AS mep_count
+        FROM member_votes mv
+        JOIN votes v ON v.id = mv.vote_id
+        GROUP BY mv.vote_id, mv.group_code, mv.position
+    """,
+    'mv_country_positions': """
+        SELECT mv.vote_id, v.timestamp, mv.country_code, mv.position, COUNT(*) AS mep_count
+        FROM member_votes mv
+        JOIN votes v ON v.id = mv.vote_id
+        GROUP BY mv.vote_id, mv.country_code, mv.position
+    """,
+}
+
+SUMMARY_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_mv_controversial_votes_margin ON mv_controversial_votes(margin)",
+    "CREATE INDEX IF NOT EXISTS idx_mv_controversial_votes_margin_ratio ON mv_controversial_votes(margin_ratio)",
+    "CREATE INDEX IF NOT EXISTS idx_mv_topic_trends_concept_year ON mv_topic_trends(eurovoc_concept_id, year)",
+    "CREATE INDEX IF NOT EXISTS idx_mv_group_positions_vote_id ON mv_group_positions(vote_id)",
+    # covers the date range totals of get_group_positions
+    "CREATE INDEX IF NOT EXISTS idx_mv_group_positions_timestamp ON mv_group_positions(timestamp, group_code, position, mep_count)",
+    "CREATE INDEX IF NOT EXISTS idx_mv_country_positions_vote_id ON mv_country_positions(vote_id)",
+    "CREATE INDEX IF NOT EXISTS idx_mv_country_positions_country ON mv_country_positions(country_code, timestamp)",
+)
+
+# Full-text indexes for the agent's topic searches, rebuilt with the summary tables.
+# eurovoc_concepts ids are text, so the label is copied instead of used as external content
+SEARCH_TABLES = {
+    'eurovoc_fts': (
+        "id UNINDEXED, label, tokenize = 'unicode61 remove_diacritics 2'",
+        "SELECT id, label FROM eurovoc_concepts",
+    ),
+}
+
 class HowTheyVoteScraper:
-    def __init__(self, db_path: str = "parliament_votes.db"):
+    def __init__(self, db_path: str = "parliament_votes.db", csv_extension: Optional[str] = None):
         self.db_path = db_path
+        # Path of sqlite's csv virtual table extension, loads the files without Python parsing
+        self.csv_extension = csv_extension
         self.base_url = "https://api.github.com/repos/HowTheyVote/data"
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'HowTheyVote-Scraper/1.0',
-            'Accept': 'application/vnd.github.v3+json'
-        })
+        # One pooled connection per concurrent download, release assets redirect to a CDN
+        self.client = httpx.Client(
+            http2=HTTP2,
+            headers={
+                'User-Agent': 'HowTheyVote-Scraper/1.0',
+                'Accept': 'application/vnd.github.v3+json'
+            },
+            limits=httpx.Limits(max_connections=DOWNLOAD_WORKERS, max_keepalive_connections=DOWNLOAD_WORKERS),
+            timeout=30,
+            follow_redirects=True
+        )
+
+        # Single sqlite connection shared by all methods, opened on first use
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_lock = threading.Lock()
 
         # Expected CSV files and their schemas
-        self.table_schemas = {
-            'members': {
-                'id': 'INTEGER PRIMARY KEY',
-                'first_name': 'TEXT',
-                'last_name': 'TEXT',
-                'country_code': 'TEXT',
-                'date_of_birth': 'DATE',
-                'email': 'TEXT',
-                'facebook': 'TEXT',
-                'twitter': 'TEXT',
-                'FOREIGN KEY (country_code)': 'REFERENCES countries(code)'
-            },
-            'countries': {
-                'code': 'TEXT PRIMARY KEY',
-                'iso_alpha_2': 'TEXT',
-                'label': 'TEXT'
-            },
-            'groups': {
-                'code': 'TEXT PRIMARY KEY',
-                'official_label': 'TEXT',
-                'label': 'TEXT',
-                'short_label': 'TEXT'
-            },
-            'group_memberships': {
-                'member_id': 'INTEGER',
-                'group_code': 'TEXT',
-                'term': 'INTEGER',
-                'start_date': 'DATE',
-                'end_date': 'DATE',
-                'FOREIGN KEY (member_id)': 'REFERENCES members(id)',
-                'FOREIGN KEY (group_code)': 'REFERENCES groups(code)'
-            },
-            'votes': {
-                'id': 'INTEGER PRIMARY KEY',
-                'timestamp': 'DATETIME',
-                'display_title': 'TEXT',
-                'reference': 'TEXT',
-                'description': 'TEXT',
-                'is_main': 'BOOLEAN',
-                'procedure_reference': 'TEXT',
-                'procedure_title': 'TEXT',
-                'procedure_type': 'TEXT',
-                'procedure_stage': 'TEXT',
-                'count_for': 'INTEGER',
-                'count_against': 'INTEGER',
-                'count_abstention': 'INTEGER',
-                'count_did_not_vote': 'INTEGER',
-                'result': 'TEXT'
-            },
-            'member_votes': {
-                'vote_id': 'INTEGER',
-                'member_id': 'INTEGER',
-                'position': 'TEXT',
-                'country_code': 'TEXT',
-                'group_code': 'TEXT',
-                'PRIMARY KEY (vote_id, member_id)': '',
-                'FOREIGN KEY (vote_id)': 'REFERENCES votes(id)',
-                'FOREIGN KEY (member_id)': 'REFERENCES members(id)'
-            },
-            'eurovoc_concepts': {
-                'id': 'TEXT PRIMARY KEY',
-                'label': 'TEXT'
-            },
-            'eurovoc_concept_votes': {
-                'vote_id': 'INTEGER',
-                'eurovoc_concept_id': 'TEXT',
-                'FOREIGN KEY (vote_id)': 'REFERENCES votes(id)',
-                'FOREIGN KEY (eurovoc_concept_id)': 'REFERENCES eurovoc_concepts(id)'
-            },
-            'oeil_subjects': {
-                'code': 'TEXT PRIMARY KEY',
-                'label': 'TEXT'
-            },
-            'oeil_subject_votes': {
-                'vote_id': 'INTEGER',
-                'oeil_subject_code': 'TEXT',
-                'FOREIGN KEY (vote_id)': 'REFERENCES votes(id)',
-                'FOREIGN KEY (oeil_subject_code)': 'REFERENCES oeil_subjects(code)'
-            },
-            'geo_areas': {
-                'code': 'TEXT PRIMARY KEY',
-                'label': 'TEXT',
-                'iso_alpha_2': 'TEXT'
-            },
-            'geo_area_votes': {
-                'vote_id': 'INTEGER',
-                'geo_area_code': 'TEXT',
-                'FOREIGN KEY (vote_id)': 'REFERENCES votes(id)',
-                'FOREIGN KEY (geo_area_code)': 'REFERENCES geo_areas(code)'
-            },
-            'committees': {
-                'code': 'TEXT PRIMARY KEY',
-                'label': 'TEXT',
-                'abbreviation': 'TEXT'
-            },
-            'responsible_committee_votes': {
-                'vote_id': 'INTEGER',
-                'committee_code': 'TEXT',
-                'FOREIGN KEY (vote_id)': 'REFERENCES votes(id)',
-                'FOREIGN KEY (committee_code)': 'REFERENCES committees(code)'
-            }
-        }
+        self.table_schemas = _TABLES
+
+    def _get_conn(self) -> sqlite3.Connection:
+        """Return the scraper's database connection, opening it if needed."""
+        with self._conn_lock:
+            if self._conn is None:
+                self._conn = sqlite3.connect(self.db_path)
+                self._conn.executescript("""
+                    PRAGMA temp_store = MEMORY;
+                    PRAGMA cache_size = -262144;
+                """)
+            return self._conn
+
+    def close(self):
+        """Close the database connection and the HTTP client."""
+        with self._conn_lock:
+            if self._conn is not None:
+                # Refresh planner statistics that got stale, with a bounded analysis cost
+                try:
+                    self._conn.execute("PRAGMA analysis_limit = 1000")
+                    self._conn.execute("PRAGMA optimize")
+                except sqlite3.DatabaseError as e:
+                    logger.warning(f"PRAGMA optimize failed: {e}")
+                self._conn.close()
+                self._conn = None
+        self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
     def get_latest_release(self) -> Dict:
         """Get information about the latest data release."""
         try:
-            response = self.session.get(f"{self.base_url}/releases/latest")
+            response = self.client.get(f"{self.base_url}/releases/latest")
             response.raise_for_status()
             return response.json()
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Failed to fetch latest release: {e}")
             raise
 
     def get_specific_release(self, tag: str) -> Dict:
         """Get information about a specific release by tag."""
         try:
-            response = self.session.get(f"{self.base_url}/releases/tags/{tag}")
+            response = self.client.get(f"{self.base_url}/releases/tags/{tag}")
             response.raise_for_status()
             return response.json()
-        except requests.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"Failed to fetch release {tag}: {e}")
             raise
 
-    def create_database_schema(self):
-        """Create the database schema with proper foreign key relationships."""
+    def create_tables(self):
+        """Create the database tables with proper foreign key relationships."""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._get_conn()
             cursor = conn.cursor()
 
             # DISABLE foreign key constraints during schema creation
             cursor.execute("PRAGMA foreign_keys = OFF")
 
-            # Define creation order - parent tables first, then children
-            table_creation_order = [
-                # Reference tables first (no dependencies)
-                'countries',
-                'groups',
-                'committees',
-                'eurovoc_concepts',
-                'oeil_subjects',
-                'geo_areas',
-
-                # Core entities
-                'members',  # depends on countries
-                'votes',    # no dependencies
-
-                # Junction/relationship tables (depend on core entities)
-                'group_memberships',           # depends on members, groups
-                'member_votes',               # depends on members, votes
-                'eurovoc_concept_votes',      # depends on votes, eurovoc_concepts
-                'oeil_subject_votes',         # depends on votes, oeil_subjects
-                'geo_area_votes',             # depends on votes, geo_areas
-                'responsible_committee_votes' # depends on votes, committees
-            ]
-
             # Drop all tables in reverse order to avoid FK conflicts
-            for table_name in reversed(table_creation_order):
+            for table_name in reversed(TABLE_ORDER):
                 if table_name not in self.table_schemas:
                     continue
                 cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
 
-            for table_name in table_creation_order:
+            for table_name in TABLE_ORDER:
                 if table_name not in self.table_schemas:
                     continue
 
-                schema = self.table_schemas[table_name]
-
-                # Create table with proper foreign keys
-                columns = []
-                constraints = []
-
-                for column, definition in schema.items():
-                    if column.startswith('PRIMARY KEY'):
-                        constraints.append(f"{column} {definition}")
-                    elif column.startswith('FOREIGN KEY'):
-                        constraints.append(f"{column} {definition}")
-                    else:
-                        columns.append(f"{column} {definition}")
-
-                create_sql = f"CREATE TABLE {table_name} (\n"
-                create_sql += ",\n".join(columns)
-                if constraints:
-                    create_sql += ",\n" + ",\n".join(constraints)
-                create_sql += "\n)"
-
                 logger.info(f"Creating table: {table_name}")
-                cursor.execute(create_sql)
-
-            # Create indexes for common queries
-            indexes = [
-                "CREATE INDEX IF NOT EXISTS idx_member_votes_vote_id ON member_votes(vote_id)",
-                "CREATE INDEX IF NOT EXISTS idx_member_votes_member_id ON member_votes(member_id)",
-                "CREATE INDEX IF NOT EXISTS idx_votes_timestamp ON votes(timestamp)",
-                "CREATE INDEX IF NOT EXISTS idx_votes_procedure_type ON votes(procedure_type)",
-                "CREATE INDEX IF NOT EXISTS idx_group_memberships_member_id ON group_memberships(member_id)",
-                "CREATE INDEX IF NOT EXISTS idx_group_memberships_group_code ON group_memberships(group_code)",
-                "CREATE INDEX IF NOT EXISTS idx_eurovoc_concept_votes_vote_id ON eurovoc_concept_votes(vote_id)",
-                "CREATE INDEX IF NOT EXISTS idx_oeil_subject_votes_vote_id ON oeil_subject_votes(vote_id)",
-                "CREATE INDEX IF NOT EXISTS idx_geo_area_votes_vote_id ON geo_area_votes(vote_id)",
-                "CREATE INDEX IF NOT EXISTS idx_responsible_committee_votes_vote_id ON responsible_committee_votes(vote_id)"
-            ]
-
-            for index_sql in indexes:
-                cursor.execute(index_sql)
+                cursor.execute(self.table_schemas[table_name].create_sql)
 
             # RE-ENABLE foreign key constraints after schema is created
             cursor.execute("PRAGMA foreign_keys = ON")
 
             conn.commit()
-            conn.close()
-            logger.info("Database schema created successfully with foreign key relationships")
+            logger.info("Database tables created successfully with foreign key relationships")
 
         except Exception as e:
-            logger.error(f"Failed to create database schema: {e}")
+            logger.error(f"Failed to create database tables: {e}")
             raise
 
-    def load_csv_to_database(self, csv_path: str, table_name: str, conn: sqlite3.Connection):
-        """Load a CSV file into the database."""
+    def create_indexes(self, conn: sqlite3.Connection):
+        """Create the indexes for common queries.
+
+        Meant to run once the data is loaded, so the bulk insert doesn't have to
+        maintain every index B-tree row by row. Runs in the caller's transaction.
+        """
         try:
-            if not os.path.exists(csv_path):
-                logger.warning(f"CSV file not found: {csv_path}")
-                return
+            for index_sql in INDEXES:
+                conn.execute(index_sql)
+
+            logger.info("Database indexes created successfully")
+
+        except Exception as e:
+            logger.error(f"Failed to create database indexes: {e}")
+            raise
+
+    def build_summary_tables(self, conn: sqlite3.Connection):
+        """Materialize the summary and search tables from the loaded data. Runs in the caller's transaction."""
+        try:
+            for table_name, select_sql in SUMMARY_TABLES.items():
+                conn.execute(f"DROP TABLE IF EXISTS {table_name}")
+                conn.execute(f"CREATE TABLE {table_name} AS {select_sql}")
+
+            for index_sql in SUMMARY_INDEXES:
+                conn.execute(index_sql)
+
+            for table_name, (columns, select_sql) in SEARCH_TABLES.items():
+                conn.execute(f"DROP TABLE IF EXISTS {table_name}")
+                conn.execute(f"CREATE VIRTUAL TABLE {table_name} USING fts5({columns})")
+                conn.execute(f"INSERT INTO {table_name} {select_sql}")
+                # merge the index into a single b-tree, it is only read from now on
+                conn.execute(f"INSERT INTO {table_name} ({table_name}) VALUES ('optimize')")
+
+            logger.info("Summary tables created successfully")
+
+        except Exception as e:
+            logger.error(f"Failed to create summary tables: {e}")
+            raise
+
+    def check_foreign_keys(self, conn: sqlite3.Connection):
+        """Log the rows whose foreign keys point to missing parent rows."""
+        violations = {}
+        for table_name, _, parent_table, _ in conn.execute("PRAGMA foreign_key_check"):
+            key = (table_name, parent_table)
+            violations[key] = violations.get(key, 0) + 1
+
+        if not violations:
+            logger.info("Foreign key check passed")
+            return
+
+        for (table_name, parent_table), count in violations.items():
+            logger.warning(f"{count} rows of {table_name} reference missing {parent_table} rows")
+
+    def load_csv_to_database(self, csv_file: BinaryIO, table_name: str, conn: sqlite3.Connection):
+        """Stream a gzipped CSV file into the database, batch by batch."""
+        try:
+            logger.info(f"Loading {table_name}")
 
-            logger.info(f"Loading {table_name} from {csv_path}")
+            # Decompress and parse on the fly, nothing is materialized besides the current batch
+            reader = csv.reader(io.TextIOWrapper(gzip.GzipFile(fileobj=csv_file), encoding='utf-8', newline=''))
 
-            # Read CSV with pandas (handles gzipped files automatically)
-            df = pd.read_csv(csv_path, compression='gzip')
+            columns = next(reader, None)
+            if columns is None:
+                logger.warning(f"CSV file for {table_name} is empty")
+                return
+
+            # Tables already exist with proper schema, the CSV header gives the column order
+            placeholders = "(" + ", ".join("?" * len(columns)) + ")"
+            insert_sql = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES {placeholders}"
 
-            # Handle empty values
-            df = df.where(pd.notnull(df), None)
+            # Multi-row INSERT, as many rows per statement as the bound variable limit allows
+            rows_per_insert = min(ROWS_PER_INSERT, conn.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER) // len(columns))
+            multi_insert_sql = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES " + ", ".join([placeholders] * rows_per_insert)
 
             # Convert boolean columns
-            if 'is_main' in df.columns:
-                df['is_main'] = df['is_main'].astype(bool)
+            schema = self.table_schemas[table_name].columns
+            boolean_columns = [i for i, column in enumerate(columns) if schema.get(column) == 'BOOLEAN']
+
+            def convert_rows():
+                for row in reader:
+                    # Handle empty values, csv only yields strings so '' is the only falsy one
+                    row = [value or None for value in row]
+                    for i in boolean_columns:
+                        row[i] = BOOLEAN_VALUES.get(row[i], row[i])
+                    yield row
+
+            # No commit here: the caller owns the transaction wrapping all the loads
+            cursor = conn.cursor()
+
+            def insert_batch(batch):
+                # Full blocks go through the multi-row statement, the remainder row by row
+                full = len(batch) - len(batch) % rows_per_insert
+                for start in range(0, full, rows_per_insert):
+                    cursor.execute(multi_insert_sql, [value for row in batch[start:start + rows_per_insert] for value in row])
+                if full < len(batch):
+                    cursor.executemany(insert_sql, batch[full:])
+
+            batch = []
+            row_count = 0
+            for row in convert_rows():
+                batch.append(row)
+
+                if len(batch) >= BATCH_SIZE:
+                    insert_batch(batch)
+                    row_count += len(batch)
+                    batch.clear()
 
-            # Load into database - use append since tables already exist with proper schema
-            df.to_sql(table_name, conn, if_exists='append', index=False)
+            if batch:
+                insert_batch(batch)
+                row_count += len(batch)
 
-            row_count = len(df)
             logger.info(f"Loaded {row_count} rows into {table_name}")
 
         except Exception as e:
             logger.error(f"Failed to load {table_name}: {e}")
             raise
 
+    def _enable_csv_extension(self, conn: sqlite3.Connection) -> bool:
+        """Load sqlite's csv virtual table extension, False if it cannot be loaded."""
+        try:
+            conn.enable_load_extension(True)
+            conn.load_extension(self.csv_extension)
+            conn.enable_load_extension(False)
+            return True
+        except (AttributeError, sqlite3.OperationalError) as e:
+            logger.warning(f"csv extension not available, loading with Python: {e}")
+            return False
+
+    def load_csv_via_virtual_table(self, csv_path: str, table_name: str, conn: sqlite3.Connection):
+        """Load a plain CSV file through the csv virtual table, sqlite parses it natively."""
+        try:
+            logger.info(f"Loading {table_name} through the csv virtual table")
+
+            filename = csv_path.replace("'", "''")
+            conn.execute(f"CREATE VIRTUAL TABLE temp.csv_import USING csv(filename='{filename}', header=YES)")
+
+            # The header gives the column names, every value comes out as text
+            columns = [column[0] for column in conn.execute("SELECT * FROM temp.csv_import LIMIT 0").description]
+
+            # Same conversions as load_csv_to_database, done in SQL
+            schema = self.table_schemas[table_name].columns
+            values = []
+            for column in columns:
+                if schema.get(column) == 'BOOLEAN':
+                    cases = " ".join(f"WHEN '{text}' THEN {value}" for text, value in BOOLEAN_VALUES.items())
+                    values.append(f'CASE "{column}" {cases} ELSE NULLIF("{column}", \'\') END')
+                else:
+                    values.append(f'NULLIF("{column}", \'\')')
+
+            select_sql = f"SELECT {', '.join(values)} FROM temp.csv_import"
+
+            # No commit here: the caller owns the transaction wrapping all the loads
+            cursor = conn.execute(f"INSERT INTO {table_name} ({', '.join(columns)}) {select_sql}")
+            logger.info(f"Loaded {cursor.rowcount} rows into {table_name}")
+
+        except Exception as e:
+            logger.error(f"Failed to load {table_name}: {e}")
+            raise
+
+        finally:
+            conn.execute("DROP TABLE IF EXISTS temp.csv_import")
+
+    def _download_blob(self, tag_name: str, table_name: str) -> bytes:
+        """Download a release CSV.gz file in memory."""
+        csv_url = f"https://github.com/HowTheyVote/data/releases/download/{tag_name}/{table_name}.csv.gz"
+
+        logger.info(f"Downloading {csv_url}")
+        response = self.client.get(csv_url)
+        response.raise_for_status()
+        return response.content
+
     def scrape_and_store(self, release_tag: Optional[str] = None):
         """Main method to scrape data and store in database."""
         logger.info("Starting HowTheyVote data scraping...")
@@ -287,47 +565,78 @@ class HowTheyVoteScraper:
 
             tag_name = release_info['tag_name']
 
-            # Create database schema with proper foreign keys
-            self.create_database_schema()
-
-            # Create temporary directory for downloads
-            with tempfile.TemporaryDirectory() as temp_dir:
-                # Load CSV files into database in proper order (parents before children)
-                load_order = [
-                    # Reference tables first
-                    'countries', 'groups', 'committees', 'eurovoc_concepts', 'oeil_subjects', 'geo_areas',
-                    # Core entities
-                    'members', 'votes',
-                    # Relationship tables last
-                    'group_memberships', 'member_votes', 'eurovoc_concept_votes',
-                    'oeil_subject_votes', 'geo_area_votes', 'responsible_committee_votes'
-                ]
-
-                conn = sqlite3.connect(self.db_path)
-
-                for table_name in load_order:
-                    if table_name not in self.table_schemas:
-                        continue
+            # Create database tables with proper foreign keys, indexes come after the load
+            self.create_tables()
 
-                    # Download individual CSV.gz file
-                    csv_url = f"https://github.com/HowTheyVote/data/releases/download/{tag_name}/{table_name}.csv.gz"
-                    csv_path = os.path.join(temp_dir, f"{table_name}.csv.gz")
+            conn = self._get_conn()
 
-                    logger.info(f"Downloading {csv_url}")
-                    try:
-                        response = self.session.get(csv_url)
-                        response.raise_for_status()
+            # Bulk ingest settings: no journal, no fsync, no foreign key checks,
+            # everything in one exclusive transaction
+            conn.executescript("""
+                PRAGMA foreign_keys = OFF;
+                PRAGMA journal_mode = OFF;
+                PRAGMA synchronous = OFF;
+                PRAGMA locking_mode = EXCLUSIVE;
+            """)
+            conn.execute("BEGIN EXCLUSIVE")
+
+            use_csv_extension = self.csv_extension is not None and self._enable_csv_extension(conn)
 
-                        with open(csv_path, 'wb') as f:
-                            f.write(response.content)
+            # Download the CSV.gz files concurrently, while the main thread inserts them
+            # one by one in load order (the sqlite writer has to stay single threaded).
+            # Only DOWNLOAD_WORKERS files are fetched ahead of the loader. Peak memory is the
+            # compressed file being loaded, those downloads and one BATCH_SIZE batch of rows,
+            # the loaders never hold a whole table. Parents are loaded before children.
+            tables = [table_name for table_name in TABLE_ORDER if table_name in self.table_schemas]
+            with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+                downloads = {}
 
-                        self.load_csv_to_database(csv_path, table_name, conn)
+                def schedule(position):
+                    if position < len(tables):
+                        downloads[tables[position]] = executor.submit(self._download_blob, tag_name, tables[position])
 
-                    except requests.RequestException as e:
+                for position in range(DOWNLOAD_WORKERS):
+                    schedule(position)
+
+                for position, table_name in enumerate(tables):
+                    download = downloads.pop(table_name)
+                    schedule(position + DOWNLOAD_WORKERS)
+
+                    try:
+                        blob = download.result()
+                    except httpx.HTTPError as e:
                         logger.warning(f"Failed to download {table_name}.csv.gz: {e}")
                         continue
 
-                conn.close()
+                    if use_csv_extension:
+                        # The virtual table reads from a file, decompress the blob to one
+                        with tempfile.NamedTemporaryFile(suffix='.csv') as csv_file:
+                            shutil.copyfileobj(gzip.GzipFile(fileobj=io.BytesIO(blob)), csv_file)
+                            csv_file.flush()
+                            self.load_csv_via_virtual_table(csv_file.name, table_name, conn)
+                    else:
+                        self.load_csv_to_database(io.BytesIO(blob), table_name, conn)
+
+                    # Let the blob go as soon as it is loaded
+                    del blob, download
+
+            self.create_indexes(conn)
+            self.build_summary_tables(conn)
+
+            # Foreign keys were not enforced during the load, verify them in one pass
+            self.check_foreign_keys(conn)
+
+            # Gather planner statistics, print_database_stats reads its row counts from them
+            conn.execute("ANALYZE")
+            conn.commit()
+
+            # Back to regular settings for the readers of the database
+            conn.executescript("""
+                PRAGMA locking_mode = NORMAL;
+                PRAGMA journal_mode = WAL;
+                PRAGMA synchronous = NORMAL;
+                PRAGMA foreign_keys = ON;
+            """)
 
             logger.info(f"Successfully scraped and stored data in {self.db_path}")
             self.print_database_stats()
@@ -339,48 +648,62 @@ class HowTheyVoteScraper:
     def verify_foreign_keys(self):
         """Verify that foreign key relationships were created properly."""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._get_conn()
             cursor = conn.cursor()
 
             print("\n" + "="*50)
             print("FOREIGN KEY RELATIONSHIPS")
             print("="*50)
 
-            # Check foreign keys for each table
-            tables_with_fks = ['members', 'group_memberships', 'member_votes', 'eurovoc_concept_votes',
-                             'oeil_subject_votes', 'geo_area_votes', 'responsible_committee_votes']
+            # All foreign keys of the database in a single query
+            cursor.execute("""
+                SELECT m.name, f."from", f."table", f."to"
+                FROM sqlite_master m, pragma_foreign_key_list(m.name) f
+                WHERE m.type = 'table'
+                ORDER BY m.name, f.id, f.seq
+            """)
+            fks_by_table = {}
+            for table_name, from_column, to_table, to_column in cursor.fetchall():
+                fks_by_table.setdefault(table_name, []).append((from_column, to_table, to_column))
 
-            for table_name in tables_with_fks:
-                cursor.execute(f"PRAGMA foreign_key_list({table_name})")
-                fks = cursor.fetchall()
+            # Check foreign keys for each table
+            for table_name in TABLES_WITH_FKS:
+                fks = fks_by_table.get(table_name)
 
                 if fks:
                     print(f"\n{table_name}:")
-                    for fk in fks:
-                        # fk = (id, seq, table, from, to, on_update, on_delete, match)
-                        print(f"  {fk[3]} → {fk[2]}.{fk[4]}")
+                    for from_column, to_table, to_column in fks:
+                        print(f"  {from_column} → {to_table}.{to_column}")
                 else:
                     print(f"\n{table_name}: No foreign keys found")
 
-            conn.close()
-
         except Exception as e:
             logger.error(f"Failed to verify foreign keys: {e}")
 
     def print_database_stats(self):
         """Print statistics about the loaded data."""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = self._get_conn()
             cursor = conn.cursor()
 
             print("\n" + "="*50)
             print("DATABASE STATISTICS")
             print("="*50)
 
+            # Row counts from the ANALYZE statistics, the largest index of a table holds all its rows
+            try:
+                cursor.execute("SELECT tbl, MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 GROUP BY tbl")
+                stat_counts = dict(cursor.fetchall())
+            except sqlite3.OperationalError:
+                stat_counts = {}
+
             for table_name in self.table_schemas.keys():
                 try:
-                    cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-                    count = cursor.fetchone()[0]
+                    count = stat_counts.get(table_name)
+                    if count is None:
+                        # No statistics for this table (never analyzed, or empty), count it
+                        cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+                        count = cursor.fetchone()[0]
                     print(f"{table_name:25}: {count:>8} rows")
                 except sqlite3.OperationalError:
                     print(f"{table_name:25}: {'N/A':>8} (table not found)")
@@ -394,8 +717,13 @@ class HowTheyVoteScraper:
                 pass
 
             try:
-                cursor.execute("SELECT MIN(timestamp), MAX(timestamp) FROM votes WHERE timestamp IS NOT NULL")
-                date_range = cursor.fetchone()
+                # Two separate probes, each one is a single descent of idx_votes_timestamp
+                # (MIN and MAX together make sqlite scan the whole index)
+                date_range = []
+                for order in ('ASC', 'DESC'):
+                    cursor.execute(f"SELECT timestamp FROM votes WHERE timestamp IS NOT NULL ORDER BY timestamp {order} LIMIT 1")
+                    row = cursor.fetchone()
+                    date_range.append(row[0] if row else None)
 
                 cursor.execute("SELECT COUNT(*) FROM votes WHERE is_main = 1")
                 main_votes = cursor.fetchone()[0]
@@ -406,8 +734,6 @@ class HowTheyVoteScraper:
             except sqlite3.OperationalError:
                 pass
 
-            conn.close()
-
             # Verify foreign key relationships
             self.verify_foreign_keys()
 
@@ -424,19 +750,20 @@ def main():
     parser.add_argument('--release-tag', help='Specific release tag (e.g., 2025-07-21)')
     parser.add_argument('--stats-only', action='store_true',
                        help='Only show database statistics')
+    parser.add_argument('--csv-extension',
+                       help="Path to sqlite's csv extension, loads the CSV files natively")
 
     args = parser.parse_args()
 
-    scraper = HowTheyVoteScraper(db_path=args.db_path)
-
-    if args.stats_only:
-        if os.path.exists(args.db_path):
-            scraper.print_database_stats()
-        else:
-            print(f"Database not found: {args.db_path}")
-        return
+    with HowTheyVoteScraper(db_path=args.db_path, csv_extension=args.csv_extension) as scraper:
+        if args.stats_only:
+            if os.path.exists(args.db_path):
+                scraper.print_database_stats()
+            else:
+                print(f"Database not found: {args.db_path}")
+            return
 
-    scraper.scrape_and_store(release_tag=args.release_tag)
+        scraper.scrape_and_store(release_tag=args.release_tag)
 
 if __name__ == "__main__":
     main()
@@ -1,12 +1,44 @@
 from dotenv import load_dotenv
-from google.adk.agents import Agent, LoopAgent
+from google.adk.agents import Agent
+from google.adk.agents.readonly_context import ReadonlyContext
 from google.adk.models.lite_llm import LiteLlm
+from google.adk.tools import ToolContext
+import asyncio
+import queue
+import re
 import sqlite3
+import textwrap
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter, Retry
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache, wraps
 from datetime import date
 
+try:
+    import orjson
+except ImportError:  # optional, only speeds up decoding SPARQL results
+    orjson = None
+
 load_dotenv()
 
+def _in_thread(tool):
+    """Run a blocking tool in a worker thread.
+
+    ADK awaits the function calls of one model turn together, so a SQL query and a
+    SPARQL request overlap instead of running one after the other, and neither
+    blocks the server's event loop.
+    """
+    @wraps(tool)
+    async def run(*args, **kwargs):
+        return await asyncio.to_thread(tool, *args, **kwargs)
+    return run
+
+# (day, answer), the answer only changes at midnight
+_date_cache: tuple[date, dict] | None = None
+
 def get_current_date() -> dict:
     """Get the current date for temporal context in analysis.
 
@@ -15,18 +47,124 @@ def get_current_date() -> dict:
 
     Note: Always returns success - no error cases.
     """
+    global _date_cache
     today = date.today()
-    return {
+    if _date_cache is not None and _date_cache[0] == today:
+        return _date_cache[1]
+
+    _date_cache = (today, {
         "current_date": today.isoformat(),  # YYYY-MM-DD format
         "year": today.year,
         "month": today.month,
         "day": today.day,
         "formatted_date": today.strftime("%B %d, %Y"),  # e.g., "July 26, 2025"
         "explanation": f"Today is {today.strftime('%B %d, %Y')}"
-    }
+    })
+    return _date_cache[1]
 
 DB_PATH = "./db_stuff/parliament_votes.db"
+# Compiled statements kept per pooled connection, sqlite3's default is 128
+STATEMENT_CACHE_SIZE = 512
+
+# Statements the agent may run, checked by sqlite as it compiles each query
+_ALLOWED_ACTIONS = frozenset({
+    sqlite3.SQLITE_SELECT,
+    sqlite3.SQLITE_READ,
+    sqlite3.SQLITE_FUNCTION,
+    sqlite3.SQLITE_RECURSIVE,
+})
+
+def _authorize_read_only(action: int, arg1, *args) -> int:
+    if action in _ALLOWED_ACTIONS:
+        return sqlite3.SQLITE_OK
+    # FTS5 reads the data version before each full-text query
+    if action == sqlite3.SQLITE_PRAGMA and arg1 == "data_version":
+        return sqlite3.SQLITE_OK
+    return sqlite3.SQLITE_DENY
+
+# Seconds a query may run, a query the model writes can loop forever and hold its connection
+QUERY_TIMEOUT = 20
+# sqlite steps between two checks of the deadline
+PROGRESS_STEPS = 10_000
+# Seconds a query waits for a connection when all of them are busy
+ACQUIRE_TIMEOUT = 10
+
+class DatabaseBusy(Exception):
+    """Every pooled connection stayed checked out for ACQUIRE_TIMEOUT seconds."""
+
+# Full-text tables opened when a connection is made, FTS5 checks the schema as it
+# opens one and the authorizer would refuse that
+SEARCH_TABLES = ("eurovoc_fts",)
+
+class ConnectionPool:
+    """Long-lived connections to the parliament database, one checked out per query.
+
+    Keeping the connections open keeps sqlite's page cache warm between tool calls.
+    """
 
+    def __init__(self, db_path: str, size: int = 4):
+        self.db_path = db_path
+        self.size = size
+        self._idle: queue.Queue[sqlite3.Connection] = queue.Queue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # read-only and immutable: the snapshot doesn't change while the agent runs,
+        # so sqlite skips file locking and journal checks on every read
+        conn = sqlite3.connect(
+            f"file:{self.db_path}?mode=ro&immutable=1",
+            uri=True, check_same_thread=False, isolation_level=None,
+            # keep the compiled canonical queries and the model's recent templates around
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+        conn.executescript("""
+            PRAGMA query_only = ON;
+            PRAGMA temp_store = MEMORY;
+            PRAGMA mmap_size = 268435456;
+            PRAGMA cache_size = -65536;
+        """)
+        for table_name in SEARCH_TABLES:
+            try:
+                conn.execute(f"SELECT 1 FROM {table_name} LIMIT 0")
+            except sqlite3.OperationalError:
+                pass  # database built before the search tables
+        # sqlite itself refuses anything but reading, whatever the query looks like
+        conn.set_authorizer(_authorize_read_only)
+        return conn
+
+    @contextmanager
+    def acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.size
+                if can_open:
+                    self._opened += 1
+            if can_open:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                # every connection is busy, wait for one to come back
+                try:
+                    conn = self._idle.get(timeout=ACQUIRE_TIMEOUT)
+                except queue.Empty:
+                    raise DatabaseBusy(
+                        f"The database is busy with other queries, no connection freed up within {ACQUIRE_TIMEOUT}s"
+                    ) from None
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+pool = ConnectionPool(DB_PATH)
+
+@_in_thread
 def execute_custom_sql(sql_query: str) -> dict:
     """Execute a custom SQL query against the European Parliament database.
 
@@ -35,65 +173,114 @@ def execute_custom_sql(sql_query: str) -> dict:
                   Should include appropriate JOINs and LIMIT clauses for performance.
 
     Returns:
-        Dict with 'status' ('success' or 'error'), 'results', 'column_names', and 'row_count'.
+        Dict with 'status' ('success' or 'error'), 'results', 'layout', 'column_names', 'row_count',
+        'truncated' (True when only the first 1000 rows are included, with a 'hint'),
+        and 'cache_hit' (True when the same query was answered before).
+        With layout 'columns', 'results' maps each column name to its list of values;
+        with layout 'rows', it is a list of rows with values in 'column_names' order.
 
     Security Note: Only SELECT queries are allowed. No INSERT, UPDATE, DELETE, or DDL operations.
     """
+    # The pooled connections' authorizer rejects anything that isn't a read while
+    # sqlite compiles the query, no keyword matching that trips on 'updated' or '%DROP%'
+    return _run_query(sql_query)
+
+# Above this many columns results are returned row by row
+MAX_COLUMNAR_COLUMNS = 12
+QUERY_CACHE_SIZE = 256
+# Rows handed back to the model at most, a query without LIMIT could return millions
+MAX_RESULT_ROWS = 1000
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _fetch(sql_query: str, params: tuple) -> tuple[tuple[str, ...], tuple[tuple, ...], bool]:
+    """Column names, rows and whether rows were cut off, cached: the agent never writes to the database."""
+    with pool.acquire() as conn:
+        # sqlite calls this every PROGRESS_STEPS steps and interrupts the query once it
+        # returns True, so a runaway query gives its connection back
+        deadline = time.monotonic() + QUERY_TIMEOUT
+        conn.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_STEPS)
+        try:
+            cursor = conn.cursor()
+
+            # Execute the query
+            cursor.execute(sql_query, params)
+            # one row past the cap tells a complete result from a truncated one,
+            # sqlite stops stepping there instead of producing the rest
+            results = cursor.fetchmany(MAX_RESULT_ROWS + 1)
+            truncated = len(results) > MAX_RESULT_ROWS
+            results = tuple(results[:MAX_RESULT_ROWS])
+
+            # Get column names
+            column_names = tuple(description[0] for description in cursor.description) if cursor.description else ()
+        finally:
+            conn.set_progress_handler(None, 0)
+
+    return column_names, results, truncated
+
+def _run_query(sql_query: str, params: tuple = ()) -> dict:
+    """Run a SELECT against the parliament database, rows formatted for the agent."""
+    # the model often sends the same query again in a later step, answer it from the cache
+    sql_query = sql_query.strip().rstrip(";").rstrip()
     try:
-        # Basic security check - only allow SELECT statements
-        query_upper = sql_query.strip().upper()
-        if not query_upper.startswith('SELECT'):
-            return {
-                "status": "error",
-                "error_message": "Only SELECT queries are allowed",
-                "error_type": "SecurityError",
-                "query": sql_query
-            }
-
-        # Check for dangerous keywords
-        dangerous_keywords = ['INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER', 'TRUNCATE']
-        for keyword in dangerous_keywords:
-            if keyword in query_upper:
-                return {
-                    "status": "error",
-                    "error_message": f"Query contains forbidden keyword: {keyword}",
-                    "error_type": "SecurityError",
-                    "query": sql_query
-                }
-
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        # Execute the query
-        cursor.execute(sql_query)
-        results = cursor.fetchall()
-
-        # Get column names
-        column_names = [description[0] for description in cursor.description] if cursor.description else []
-
-        conn.close()
-
-        # Format results as list of dictionaries for easier processing
-        formatted_results = []
-        for row in results:
-            formatted_results.append(dict(zip(column_names, row)))
+        # approximate when tools run concurrently, other threads' hits count too
+        hits = _fetch.cache_info().hits
+        column_names, results, truncated = _fetch(sql_query, params)
+        cache_hit = _fetch.cache_info().hits > hits
+
+        # Columnar results, one list of values per column instead of one dict per row.
+        # Wide results are left as rows, their values in column_names order
+        if len(column_names) <= MAX_COLUMNAR_COLUMNS:
+            columns = list(zip(*results)) if results else [()] * len(column_names)
+            formatted_results = {name: list(values) for name, values in zip(column_names, columns)}
+            layout = "columns"
+        else:
+            formatted_results = list(results)
+            layout = "rows"
 
-        return {
+        response = {
             "status": "success",
             "query": sql_query,
             "results": formatted_results,
-            "column_names": column_names,
+            "layout": layout,
+            "column_names": list(column_names),
             "row_count": len(results),
+            "truncated": truncated,
+            "cache_hit": cache_hit,
             "explanation": f"Query returned {len(results)} rows with columns: {', '.join(column_names)}"
         }
+        if truncated:
+            response["explanation"] = f"Query returned more than {MAX_RESULT_ROWS} rows, only the first {MAX_RESULT_ROWS} are included"
+            response["hint"] = "Add a LIMIT clause or aggregate before returning raw rows"
+        return response
 
     except sqlite3.Error as e:
+        if str(e) == "not authorized":
+            return {
+                "status": "error",
+                "error_message": "Only SELECT queries are allowed",
+                "error_type": "SecurityError",
+                "query": sql_query
+            }
+        if str(e) == "interrupted":
+            return {
+                "status": "error",
+                "error_message": f"Query stopped after {QUERY_TIMEOUT}s, add filters or a LIMIT, or avoid unbounded recursion",
+                "error_type": "QueryTimeout",
+                "query": sql_query
+            }
         return {
             "status": "error",
             "error_message": str(e),
             "error_type": "SQLError",
             "query": sql_query
         }
+    except DatabaseBusy as e:
+        return {
+            "status": "error",
+            "error_message": str(e),
+            "error_type": "DatabaseBusy",
+            "query": sql_query
+        }
     except Exception as e:
         return {
             "status": "error",
@@ -102,6 +289,202 @@ def execute_custom_sql(sql_query: str) -> dict:
             "query": sql_query
         }
 
+# Ready-made queries for the most common questions, the agent only binds the parameters
+CANONICAL_QUERIES = {
+    "member_voting_history": """
+        SELECT m.first_name, m.last_name, mv.position, v.display_title, v.timestamp
+        FROM members m
+        JOIN member_votes mv ON m.id = mv.member_id
+        JOIN votes v ON mv.vote_id = v.id
+        WHERE m.last_name = ? COLLATE NOCASE
+        ORDER BY v.timestamp DESC
+        LIMIT ?""",
+    "topic_votes": """
+        SELECT v.display_title, ec.label AS topic, v.timestamp, v.result
+        FROM votes v
+        JOIN eurovoc_concept_votes ecv ON v.id = ecv.vote_id
+        JOIN eurovoc_concepts ec ON ecv.eurovoc_concept_id = ec.id
+        WHERE ec.id IN (SELECT id FROM eurovoc_fts WHERE eurovoc_fts MATCH ?)
+        ORDER BY v.timestamp DESC
+        LIMIT ?""",
+    "close_votes": """
+        SELECT display_title, procedure_title, count_for, count_against, margin, timestamp
+        FROM mv_controversial_votes
+        ORDER BY margin ASC
+        LIMIT ?""",
+    "topic_trends": """
+        SELECT year, label, vote_count, count_for, count_against, count_abstention
+        FROM mv_topic_trends
+        WHERE eurovoc_concept_id IN (SELECT id FROM eurovoc_fts WHERE eurovoc_fts MATCH ?)
+        ORDER BY label, year
+        LIMIT ?""",
+    # summed from the per-vote group totals, the few group/position totals are labelled afterwards
+    "group_positions": """
+        SELECT t.group_code, g.short_label, t.position, t.vote_count
+        FROM (
+            SELECT group_code, position, SUM(mep_count) AS vote_count
+            FROM mv_group_positions
+            WHERE timestamp >= ?
+            GROUP BY group_code, position
+        ) t
+        JOIN groups g ON g.code = t.group_code
+        ORDER BY t.group_code, t.vote_count DESC""",
+}
+
+MAX_CANONICAL_ROWS = 1000
+
+def _topic_match(topic: str) -> str:
+    """FTS5 query for labels with every word of the topic, 'climate chan' -> '"climate"* "chan"*'."""
+    return " ".join(f'"{word}"*' for word in re.findall(r"\w+", topic)) or '""'
+
+@_in_thread
+def get_member_voting_history(last_name: str, limit: int = 100) -> dict:
+    """Get how an MEP voted, most recent votes first.
+
+    Args:
+        last_name: The MEP's last name, e.g. 'GOERENS' (case insensitive)
+        limit: Maximum number of votes to return (at most 1000)
+
+    Returns:
+        Dict with 'status' ('success' or 'error'), 'results' (one list of values per column),
+        'column_names', and 'row_count'.
+    """
+    return _run_query(CANONICAL_QUERIES["member_voting_history"], (last_name, min(limit, MAX_CANONICAL_ROWS)))
+
+@_in_thread
+def get_topic_votes(topic: str, limit: int = 100) -> dict:
+    """Get the votes tagged with a EuroVoc topic, most recent first.
+
+    Args:
+        topic: Words to look for in the topic label, matched as word prefixes in any order, e.g. 'climate'
+        limit: Maximum number of votes to return (at most 1000)
+
+    Returns:
+        Dict with 'status' ('success' or 'error'), 'results' (one list of values per column),
+        'column_names', and 'row_count'.
+    """
+    return _run_query(CANONICAL_QUERIES["topic_votes"], (_topic_match(topic), min(limit, MAX_CANONICAL_ROWS)))
+
+@_in_thread
+def get_close_votes(limit: int = 20) -> dict:
+    """Get the closest votes, smallest margin between FOR and AGAINST first.
+
+    Args:
+        limit: Maximum number of votes to return (at most 1000)
+
+    Returns:
+        Dict with 'status' ('success' or 'error'), 'results' (one list of values per column),
+        'column_names', and 'row_count'.
+    """
+    return _run_query(CANONICAL_QUERIES["close_votes"], (min(limit, MAX_CANONICAL_ROWS),))
+
+@_in_thread
+def get_topic_trends(topic: str, limit: int = 100) -> dict:
+    """Get the number of votes and vote totals per year for EuroVoc topics.
+
+    Args:
+        topic: Words to look for in the topic label, matched as word prefixes in any order, e.g. 'climate'
+        limit: Maximum number of topic/year rows to return (at most 1000)
+
+    Returns:
+        Dict with 'status' ('success' or 'error'), 'results' (one list of values per column),
+        'column_names', and 'row_count'.
+    """
+    return _run_query(CANONICAL_QUERIES["topic_trends"], (_topic_match(topic), min(limit, MAX_CANONICAL_ROWS)))
+
+@_in_thread
+def get_group_positions(since_date: str) -> dict:
+    """Get how often each political group voted FOR, AGAINST, ABSTENTION or DID_NOT_VOTE.
+
+    Args:
+        since_date: Only count votes from this date on, 'YYYY-MM-DD', e.g. '2024-07-16'
+
+    Returns:
+        Dict with 'status' ('success' or 'error'), 'results' (one list of values per column),
+        'column_names', and 'row_count'.
+    """
+    return _run_query(CANONICAL_QUERIES["group_positions"], (since_date,))
+
+# One keep-alive session for EUR-Lex, every query doesn't pay a new TCP handshake.
+# SPARQL queries only read, so retrying the POST on a gateway error is safe.
+# A read timeout is not retried, a query that ran out its 30 seconds would just do it again
+_SPARQL_SESSION = requests.Session()
+_SPARQL_ADAPTER = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(
+        total=2,
+        read=0,
+        backoff_factor=0.3,
+        status_forcelist=[502, 503, 504],
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | {"POST"},
+        raise_on_status=False,
+    ),
+)
+_SPARQL_SESSION.mount("http://", _SPARQL_ADAPTER)
+_SPARQL_SESSION.mount("https://", _SPARQL_ADAPTER)
+
+# (connect, read) seconds, an unreachable endpoint fails in seconds while a slow query still gets its 30
+SPARQL_TIMEOUT = (3.05, 30)
+
+class CircuitBreaker:
+    """Fails calls fast for `cooldown` seconds after `threshold` failures in a row."""
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    def check(self):
+        with self._lock:
+            remaining = self._open_until - time.monotonic()
+        if remaining > 0:
+            raise requests.ConnectionError(
+                f"EUR-Lex endpoint unavailable after repeated failures, retry in {remaining:.0f}s"
+            )
+
+    def success(self):
+        with self._lock:
+            self._failures = 0
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.threshold:
+                self._failures = 0
+                self._open_until = time.monotonic() + self.cooldown
+
+# EUR-Lex outages are common, once it's down every query would wait out the timeouts and retries
+_SPARQL_BREAKER = CircuitBreaker(threshold=5, cooldown=30)
+
+# EUR-Lex answers are slow, the model repeats its discovery queries across steps and
+# sessions. Legislation metadata changes slowly, an hour old answer is still good
+SPARQL_CACHE_SIZE = 512
+SPARQL_CACHE_TTL = 60 * 60
+_sparql_cache: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+_sparql_cache_lock = threading.Lock()
+
+_SPARQL_QUERY_TYPE_RE = re.compile(r'\b(SELECT|CONSTRUCT|ASK|DESCRIBE)\b', re.IGNORECASE)
+
+SPARQL_HEADERS = {
+    'Accept': 'application/sparql-results+json',
+    'Content-Type': 'application/x-www-form-urlencoded',
+    'User-Agent': 'Frateto/Parliament-Agent'
+}
+
+# Readable names for the EUR-Lex resource-type codes
+DOCUMENT_TYPES = {
+    'REG': 'Regulation',
+    'DIR': 'Directive',
+    'DEC': 'Decision',
+    'RECO': 'Recommendation',
+    'DECIS': 'Decision',
+    'RECOMM': 'Recommendation'
+}
+
+@_in_thread
 def execute_eurlex_sparql(sparql_query: str) -> dict:
     """Execute SPARQL query against EUR-Lex for EU legislation discovery.
 
@@ -109,23 +492,115 @@ def execute_eurlex_sparql(sparql_query: str) -> dict:
         sparql_query: A SPARQL query for EUR-Lex legislation discovery
 
     Returns:
-        Dict with 'status' ('success' or 'error'), 'results' (including eurlex_url), and 'row_count'.
+        Dict with 'status' ('success' or 'error'), 'results' (each variable mapped to its list of
+        values, including eurlex_url), 'column_names', 'row_count', and 'cache_hit' (True when the
+        same query was answered in the last hour). An ASK query's answer is in 'boolean'.
 
     Note: Returns metadata only (CELEX, dates, types). No full text or legal status.
           Recent legislation may have database lag. Always provide EUR-Lex URLs.
     """
-    try:
-        endpoint = "http://publications.europa.eu/webapi/rdf/sparql"
+    cached = _cached_sparql(sparql_query)
+    if cached is not None:
+        return cached
+    return _remember_sparql(sparql_query, _run_sparql(sparql_query))
 
+@_in_thread
+def execute_eurlex_sparql_batch(sparql_queries: list[str]) -> dict:
+    """Execute several SELECT SPARQL queries against EUR-Lex in a single request.
+
+    Use it instead of several execute_eurlex_sparql calls when the queries don't depend on each other.
+
+    Args:
+        sparql_queries: SPARQL SELECT queries, each one written as for execute_eurlex_sparql
+
+    Returns:
+        Dict with 'status' and 'responses', the execute_eurlex_sparql result of each query in order.
+        Queries with ORDER BY still get their own request, the others share one.
+    """
+    responses: list[dict | None] = [_cached_sparql(query) for query in sparql_queries]
+    pending = [i for i, response in enumerate(responses) if response is None]
+
+    # one round trip for all the uncached queries, when they can be combined. A subquery's
+    # ORDER BY only picks the rows its LIMIT keeps, the combined rows come back in no
+    # particular order, so ordered queries are sent on their own
+    unordered = [i for i in pending if not _SPARQL_ORDER_BY_RE.search(sparql_queries[i])]
+    combined = _combine_sparql([sparql_queries[i] for i in unordered]) if len(unordered) > 1 else None
+    if combined is not None:
+        try:
+            rows = _fetch_sparql(combined)
+        except Exception:
+            rows = None
+        if isinstance(rows, list):
+            batches = [[] for _ in unordered]
+            for row in rows:
+                batches[int(row.pop(BATCH_VARIABLE))].append(row)
+            for i, batch in zip(unordered, batches):
+                responses[i] = _remember_sparql(sparql_queries[i], _sparql_response(sparql_queries[i], batch))
+            pending = [i for i in pending if responses[i] is None]
+
+    # ordered, not combinable, or the endpoint refused the combined query: one request each
+    for i in pending:
+        responses[i] = _remember_sparql(sparql_queries[i], _run_sparql(sparql_queries[i]))
+
+    return {
+        "status": "success",
+        "responses": responses
+    }
+
+def _cached_sparql(sparql_query: str) -> dict | None:
+    key = sparql_query.strip()
+    with _sparql_cache_lock:
+        entry = _sparql_cache.get(key)
+        if entry is not None and entry[0] + SPARQL_CACHE_TTL > time.monotonic():
+            _sparql_cache.move_to_end(key)
+            return {**entry[1], "cache_hit": True}
+    return None
+
+def _remember_sparql(sparql_query: str, response: dict) -> dict:
+    if response["status"] == "success":
+        key = sparql_query.strip()
+        with _sparql_cache_lock:
+            _sparql_cache[key] = (time.monotonic(), response)
+            _sparql_cache.move_to_end(key)
+            if len(_sparql_cache) > SPARQL_CACHE_SIZE:
+                _sparql_cache.popitem(last=False)
+        response = {**response, "cache_hit": False}
+    return response
+
+# Tags which query of a batch a row belongs to
+BATCH_VARIABLE = "frateto_batch"
+_SPARQL_PREFIX_RE = re.compile(r'\s*PREFIX\s+([\w.-]*:)\s*(<[^>]*>)', re.IGNORECASE)
+_SPARQL_SELECT_RE = re.compile(r'\s*SELECT\b', re.IGNORECASE)
+_SPARQL_ORDER_BY_RE = re.compile(r'\bORDER\s+BY\b', re.IGNORECASE)
+
+def _combine_sparql(sparql_queries: list[str]) -> str | None:
+    """One query running each SELECT as a subquery, their rows tagged with BATCH_VARIABLE.
+
+    None when the queries can't be combined: not all SELECT, or a prefix bound to two IRIs.
+    """
+    prefixes: dict[str, str] = {}
+    blocks = []
+    for n, query in enumerate(sparql_queries):
+        position = 0
+        while match := _SPARQL_PREFIX_RE.match(query, position):
+            name, iri = match.groups()
+            if prefixes.setdefault(name, iri) != iri:
+                return None
+            position = match.end()
+        body = query[position:]
+        if not _SPARQL_SELECT_RE.match(body):
+            return None
+        blocks.append(f'{{ {{ {body.strip()} }} BIND("{n}" AS ?{BATCH_VARIABLE}) }}')
+
+    header = "".join(f"PREFIX {name} {iri}\n" for name, iri in prefixes.items())
+    return header + "SELECT * WHERE {\n" + "\nUNION\n".join(blocks) + "\n}"
+
+def _run_sparql(sparql_query: str) -> dict:
+    """Send a SPARQL query to EUR-Lex, bindings formatted for the agent."""
+    try:
         # Improved validation - check for query types anywhere in the query
         # This handles PREFIX statements before the main query type
-        query_upper = sparql_query.strip().upper()
-        has_valid_query_type = any(
-            query_type in query_upper
-            for query_type in ['SELECT', 'CONSTRUCT', 'ASK', 'DESCRIBE']
-        )
-
-        if not has_valid_query_type:
+        if not _SPARQL_QUERY_TYPE_RE.search(sparql_query):
             return {
                 "status": "error",
                 "error_message": "Only SELECT, CONSTRUCT, ASK, or DESCRIBE SPARQL queries allowed",
@@ -134,70 +609,25 @@ def execute_eurlex_sparql(sparql_query: str) -> dict:
                 "note": "Queries with PREFIX statements are supported"
             }
 
-        headers = {
-            'Accept': 'application/sparql-results+json',
-            'Content-Type': 'application/x-www-form-urlencoded',
-            'User-Agent': 'Frateto/Parliament-Agent'
-        }
+        rows = _fetch_sparql(sparql_query)
+        if isinstance(rows, list):
+            return _sparql_response(sparql_query, rows)
 
-        data = {'query': sparql_query}
-        response = requests.post(endpoint, headers=headers, data=data, timeout=30)
-        response.raise_for_status()
-
-        results = response.json()
-
-        if 'results' in results and 'bindings' in results['results']:
-            bindings = results['results']['bindings']
-            formatted_results = []
-
-            for binding in bindings:
-                row = {}
-                for var, value in binding.items():
-                    row[var] = value.get('value', '')
-
-                # Add EUR-Lex URL and human-readable info
-                if 'celex' in row and row['celex']:
-                    row['eurlex_url'] = f"https://eur-lex.europa.eu/legal-content/EN/TXT/?uri=CELEX:{row['celex']}"
-                    row['eurlex_all_languages'] = f"https://eur-lex.europa.eu/legal-content/ALL/?uri=CELEX:{row['celex']}"
-
-                    # Decode document type for readability
-                    if 'type' in row:
-                        # Handle both short codes and full URIs
-                        type_value = row['type']
-                        if 'resource-type' in type_value:
-                            # Extract type from URI like http://publications.europa.eu/resource/authority/resource-type/REG
-                            type_code = type_value.split('/')[-1]
-                        else:
-                            type_code = type_value
-
-                        type_map = {
-                            'REG': 'Regulation',
-                            'DIR': 'Directive',
-                            'DEC': 'Decision',
-                            'RECO': 'Recommendation',
-                            'DECIS': 'Decision',
-                            'RECOMM': 'Recommendation'
-                        }
-                        row['document_type_readable'] = type_map.get(type_code, type_code)
-
-                formatted_results.append(row)
-
-            return {
-                "status": "success",
-                "query": sparql_query,
-                "results": formatted_results,
-                "row_count": len(formatted_results),
-                "explanation": f"Found {len(formatted_results)} EU legislation items. Use eurlex_url for full titles and content.",
-                "note": "EUR-Lex SPARQL provides discovery/metadata only. Click eurlex_url links for complete information."
-            }
+        # no bindings to tabulate, the result has the same shape as an empty SELECT
+        response = {
+            "status": "success",
+            "query": sparql_query,
+            "results": {},
+            "layout": "columns",
+            "column_names": [],
+            "row_count": 0,
+        }
+        if isinstance(rows, bool):
+            response["boolean"] = rows
+            response["explanation"] = f"The ASK query answered {str(rows).lower()}"
         else:
-            return {
-                "status": "success",
-                "query": sparql_query,
-                "results": [],
-                "row_count": 0,
-                "explanation": "No EU legislation found matching criteria"
-            }
+            response["explanation"] = "The endpoint returned no variable bindings, use a SELECT query to list legislation"
+        return response
 
     except requests.RequestException as e:
         return {
@@ -214,10 +644,83 @@ def execute_eurlex_sparql(sparql_query: str) -> dict:
             "query": sparql_query
         }
 
-def update_analysis_state(current_step: int, analysis_complete: bool, findings: str) -> dict:
+def _fetch_sparql(sparql_query: str) -> list[dict] | bool | None:
+    """Each binding of the query's results as a dict of variable values.
+
+    An ASK query's answer as a bool, None for results without bindings.
+    """
+    endpoint = "http://publications.europa.eu/webapi/rdf/sparql"
+
+    _SPARQL_BREAKER.check()
+    data = {'query': sparql_query}
+    try:
+        response = _SPARQL_SESSION.post(endpoint, headers=SPARQL_HEADERS, data=data, timeout=SPARQL_TIMEOUT)
+    except (requests.ConnectionError, requests.Timeout):
+        _SPARQL_BREAKER.failure()
+        raise
+    # a 4xx is the query's fault, the endpoint itself answered
+    if response.status_code >= 500:
+        _SPARQL_BREAKER.failure()
+    else:
+        _SPARQL_BREAKER.success()
+    response.raise_for_status()
+
+    results = orjson.loads(response.content) if orjson is not None else response.json()
+
+    if 'results' in results and 'bindings' in results['results']:
+        return [
+            {var: value.get('value', '') for var, value in binding.items()}
+            for binding in results['results']['bindings']
+        ]
+    if isinstance(results.get('boolean'), bool):
+        return results['boolean']
+    return None
+
+def _sparql_response(sparql_query: str, rows: list[dict]) -> dict:
+    """The tool result for a query's bindings, each row a dict of variable values."""
+    for row in rows:
+        # Add EUR-Lex URL and human-readable info
+        celex = row.get('celex')
+        if celex:
+            row['eurlex_url'] = f"https://eur-lex.europa.eu/legal-content/EN/TXT/?uri=CELEX:{celex}"
+            row['eurlex_all_languages'] = f"https://eur-lex.europa.eu/legal-content/ALL/?uri=CELEX:{celex}"
+
+            # Decode document type for readability
+            type_value = row.get('type')
+            if type_value is not None:
+                # Handle both short codes and full URIs like
+                # http://publications.europa.eu/resource/authority/resource-type/REG
+                type_code = type_value.rpartition('/')[2] if 'resource-type' in type_value else type_value
+                row['document_type_readable'] = DOCUMENT_TYPES.get(type_code, type_code)
+
+    # Columnar like the SQL results, the variable names aren't repeated in every row.
+    # Variables a row doesn't bind are ''
+    column_names = list(dict.fromkeys(name for row in rows for name in row))
+    columns = {name: [row.get(name, '') for row in rows] for name in column_names}
+
+    return {
+        "status": "success",
+        "query": sparql_query,
+        "results": columns,
+        "layout": "columns",
+        "column_names": column_names,
+        "row_count": len(rows),
+        "explanation": f"Found {len(rows)} EU legislation items. Use eurlex_url for full titles and content.",
+        "note": "EUR-Lex SPARQL provides discovery/metadata only. Click eurlex_url links for complete information."
+    }
+
+# next_action, indexed by analysis_complete
+_NEXT_ACTIONS = ("Continue analysis", "Analysis complete")
+
+def update_analysis_state(
+    current_step: int,
+    analysis_complete: bool,
+    findings: str,
+    tool_context: ToolContext
+) -> dict:
     """Update the analysis state variables.
 
-    Use this tool to track multi-step analysis progress and signal completion.
+    Use this tool to record progress in a multi-step analysis and signal completion.
 
     Args:
         current_step: The current step number (increment by 1 each call)
@@ -225,24 +728,231 @@ def update_analysis_state(current_step: int, analysis_complete: bool, findings:
         findings: Summary of current findings (for tracking progress)
 
     Returns:
-        Dict with 'status', 'step', 'complete', and progress information
+        Dict with 'status', 'step', 'complete', 'findings', and 'next_action'
     """
+    # Kept in the session, later turns of the conversation can pick the analysis up
+    tool_context.state["analysis_step"] = current_step
+    tool_context.state["analysis_complete"] = analysis_complete
+    tool_context.state["findings"] = findings
+
     return {
         "status": "success",
         "step": current_step,
         "complete": analysis_complete,
         "findings": findings,
-        "message": f"Updated to step {current_step}, complete: {analysis_complete}",
-        "next_action": "Continue analysis" if not analysis_complete else "Analysis complete"
+        # the model's arguments arrive unconverted, "false" or null must not break the run
+        "next_action": _NEXT_ACTIONS[bool(analysis_complete)]
     }
 
-frateto_analyzer = Agent(
-    name="sql_analyzer",
-    model=LiteLlm(
-        model= "fireworks_ai/accounts/fireworks/models/kimi-k2-instruct-0905",
-    ),
-    description="Performs iterative analysis of European Parliament data using custom SQL queries",
-    instruction="""
+# Example queries the model fetches with get_query_reference when it needs them, instead
+# of sending them in the instruction on every call
+QUERY_REFERENCE = {
+    "sql_patterns": textwrap.dedent("""
+    === KEY SQLite QUERY PATTERNS ===
+
+    **🔗 MEP Voting History:**
+    ```sql
+    SELECT m.first_name, m.last_name, mv.position, v.display_title, v.timestamp
+    FROM members m
+    JOIN member_votes mv ON m.id = mv.member_id
+    JOIN votes v ON mv.vote_id = v.id
+    WHERE m.last_name = 'GOERENS'
+    ORDER BY v.timestamp DESC
+    LIMIT 100;
+    ```
+
+    **🔗 Vote Topics (EuroVoc concepts):**
+    ```sql
+    SELECT v.display_title, ec.label as topic, v.timestamp
+    FROM votes v
+    JOIN eurovoc_concept_votes ecv ON v.id = ecv.vote_id
+    JOIN eurovoc_concepts ec ON ecv.eurovoc_concept_id = ec.id
+    -- full-text search on the labels: every word, as a prefix, in any order
+    WHERE ec.id IN (SELECT id FROM eurovoc_fts WHERE eurovoc_fts MATCH '"climate"* "change"*')
+    ORDER BY v.timestamp DESC
+    LIMIT 100;
+    ```
+
+    **🔗 Political Group Analysis (use the per-vote totals in mv_group_positions - RECOMMENDED):**
+    ```sql
+    SELECT gp.group_code, g.short_label, gp.position, SUM(gp.mep_count) as vote_count
+    FROM mv_group_positions gp
+    JOIN groups g ON gp.group_code = g.code
+    WHERE gp.timestamp >= '2024-01-01'
+    GROUP BY gp.group_code, g.short_label, gp.position
+    ORDER BY vote_count DESC
+    LIMIT 50;
+    ```
+
+    **🔗 Country Voting Patterns:**
+    ```sql
+    SELECT cp.country_code, c.label, cp.position, SUM(cp.mep_count) as count
+    FROM mv_country_positions cp
+    JOIN countries c ON cp.country_code = c.code
+    JOIN votes v ON cp.vote_id = v.id
+    WHERE v.procedure_type = 'COD'
+    GROUP BY cp.country_code, c.label, cp.position
+    ORDER BY count DESC
+    LIMIT 100;
+    ```
+
+    **🔗 Committee Responsibility:**
+    ```sql
+    SELECT v.display_title, v.procedure_title, cm.label as committee, v.timestamp
+    FROM votes v
+    JOIN responsible_committee_votes rcv ON v.id = rcv.vote_id
+    JOIN committees cm ON rcv.committee_code = cm.code
+    WHERE cm.code = 'ENVI'
+    ORDER BY v.timestamp DESC
+    LIMIT 100;
+    ```
+
+    **🔗 Geographic Area Analysis:**
+    ```sql
+    SELECT v.display_title, ga.label as geographic_area, v.result
+    FROM votes v
+    JOIN geo_area_votes gav ON v.id = gav.vote_id
+    JOIN geo_areas ga ON gav.geo_area_code = ga.code
+    WHERE ga.label LIKE '%Venezuela%'
+    LIMIT 50;
+    ```
+
+    **🔗 Legislative Subject Analysis:**
+    ```sql
+    SELECT v.display_title, os.label as subject, v.procedure_type
+    FROM votes v
+    JOIN oeil_subject_votes osv ON v.id = osv.vote_id
+    JOIN oeil_subjects os ON osv.oeil_subject_code = os.code
+    WHERE os.label LIKE '%citizenship%'
+    LIMIT 50;
+    ```
+
+    **🔗 Close Votes Analysis:**
+    ```sql
+    SELECT display_title, procedure_title, count_for, count_against, margin, timestamp
+    FROM mv_controversial_votes
+    ORDER BY margin ASC
+    LIMIT 20;
+    ```
+
+    **🔗 Topic Trends:**
+    ```sql
+    SELECT year, label, vote_count, count_for, count_against
+    FROM mv_topic_trends
+    WHERE label LIKE '%climate%'
+    ORDER BY year;
+    ```
+
+    **🔗 MEP Group History (historical membership tracking):**
+    ```sql
+    SELECT m.first_name, m.last_name, g.short_label,
+           gm.start_date, gm.end_date, gm.term
+    FROM members m
+    JOIN group_memberships gm ON m.id = gm.member_id
+    JOIN groups g ON gm.group_code = g.code
+    WHERE m.last_name = 'GOERENS'
+    ORDER BY gm.start_date;
+    ```
+    """),
+    "sparql_patterns": textwrap.dedent("""
+    ### **🔍 OPTIMIZED QUERY PATTERNS (Field-Tested)**
+
+    **1. Recent Legislation by Pattern (RECOMMENDED for 2024+ laws):**
+    ```sparql
+    PREFIX cdm: <http://publications.europa.eu/ontology/cdm#>
+    SELECT ?work ?celex ?date ?type WHERE {
+      ?work cdm:resource_legal_id_celex ?celex .
+      ?work cdm:work_date_document ?date .
+      ?work cdm:work_has_resource-type ?type .
+      FILTER(REGEX(?celex, "2024.*R.*", "i"))
+      FILTER(BOUND(?celex))
+      FILTER(?date >= "2024-01-01"^^<http://www.w3.org/2001/XMLSchema#date>)
+    } ORDER BY DESC(?date) LIMIT 10
+    ```
+
+    **2. EuroVoc Topic Discovery (Works Well):**
+    ```sparql
+    PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
+    PREFIX cdm: <http://publications.europa.eu/ontology/cdm#>
+    SELECT DISTINCT ?topic_label WHERE {
+      ?work cdm:work_is_about_concept_eurovoc ?concept .
+      ?concept skos:prefLabel ?topic_label .
+      FILTER(LANG(?topic_label) = "en")
+      FILTER(CONTAINS(LCASE(?topic_label), "artificial intelligence"))
+    } LIMIT 10
+    ```
+
+    **3. GDPR/Privacy Laws (Reliable Historical Data):**
+    ```sparql
+    PREFIX cdm: <http://publications.europa.eu/ontology/cdm#>
+    SELECT ?work ?celex ?date ?type WHERE {
+      ?work cdm:resource_legal_id_celex ?celex .
+      ?work cdm:work_date_document ?date .
+      ?work cdm:work_has_resource-type ?type .
+      FILTER(?date >= "2016-01-01"^^<http://www.w3.org/2001/XMLSchema#date>)
+      FILTER(REGEX(?celex, ".*679.*|.*2016R679.*", "i"))
+    } ORDER BY DESC(?date) LIMIT 10
+    ```
+
+    **4. Resource Type Exploration:**
+    ```sparql
+    PREFIX cdm: <http://publications.europa.eu/ontology/cdm#>
+    SELECT DISTINCT ?type WHERE {
+      ?work cdm:work_has_resource-type ?type .
+      VALUES ?type {
+        <http://publications.europa.eu/resource/authority/resource-type/REG>
+        <http://publications.europa.eu/resource/authority/resource-type/DIR>
+        <http://publications.europa.eu/resource/authority/resource-type/DEC>
+      }
+    } LIMIT 5
+    ```
+    """),
+    "sparql_troubleshooting": textwrap.dedent("""
+    ### **💡 PRACTICAL TROUBLESHOOTING**
+
+    **If exact CELEX fails:**
+    - Try pattern matching: `FILTER(REGEX(?celex, "2024.*1689.*", "i"))`
+    - Broaden the search: `FILTER(REGEX(?celex, "2024.*R.*", "i"))`
+
+    **If query times out:**
+    - Reduce LIMIT to 5-10
+    - Add more specific FILTER conditions
+    - Use BOUND() checks: `FILTER(BOUND(?celex))`
+
+    **If no results for recent laws:**
+    - **Acknowledge database lag**: "The SPARQL endpoint may not have the latest legislation"
+    - **Provide constructed URLs anyway**: Use expected CELEX patterns
+    - **Cross-reference with parliament votes**: Look for CELEX in vote descriptions
+    """),
+}
+
+def get_query_reference(section: str) -> dict:
+    """Get worked example queries for writing SQL or SPARQL.
+
+    Args:
+        section: 'sql_patterns', 'sparql_patterns', or 'sparql_troubleshooting'
+
+    Returns:
+        Dict with 'status' ('success' or 'error') and 'reference' (Markdown with the example queries).
+    """
+    reference = QUERY_REFERENCE.get(section.strip().lower())
+    if reference is None:
+        return {
+            "status": "error",
+            "error_message": f"Unknown section: {section}",
+            "error_type": "ValidationError",
+            "sections": list(QUERY_REFERENCE)
+        }
+    return {
+        "status": "success",
+        "section": section,
+        "reference": reference
+    }
+
+# Built once at import and dedented, so the indentation isn't sent as tokens on every
+# model call. Passed through a provider, ADK doesn't scan it for {state} placeholders on
+# each call, its braces are all SPARQL
+ANALYZER_INSTRUCTION = textwrap.dedent("""
     You are Frateto, expert on BOTH European Parliament voting behavior AND EU legislation.
     You are not political and your answer are clear and explain the facts as clearly and rationally as possible.
     Format your answers in Markdown when appropriate. Use code blocks for code, bullet points, headings, and bold text where relevant.
@@ -316,6 +1026,8 @@ frateto_analyzer = Agent(
     ```sql
     Columns: id, label
     Example: '1002' → 'long-term financing', '1005' → 'EU financing'
+    Search the labels with the EUROVOC_FTS full-text table (columns: id, label), faster and
+    more forgiving than LIKE: `WHERE eurovoc_fts MATCH '"climate"* "change"*'`
     ```
 
     **7. COMMITTEES** (24 rows) - Parliamentary committees
@@ -367,111 +1079,42 @@ frateto_analyzer = Agent(
     (Categorizes votes by legislative procedure subjects)
     ```
 
-    === KEY SQLite QUERY PATTERNS ===
+    === SUMMARY TABLES (pre-aggregated, prefer them over scanning votes) ===
 
-    **🔗 MEP Voting History:**
+    **15. MV_CONTROVERSIAL_VOTES** - Votes with both FOR and AGAINST, with their margin
     ```sql
-    SELECT m.first_name, m.last_name, mv.position, v.display_title, v.timestamp
-    FROM members m
-    JOIN member_votes mv ON m.id = mv.member_id
-    JOIN votes v ON mv.vote_id = v.id
-    WHERE m.last_name = 'GOERENS'
-    ORDER BY v.timestamp DESC
-    LIMIT 100;
-    ```
-
-    **🔗 Vote Topics (EuroVoc concepts):**
-    ```sql
-    SELECT v.display_title, ec.label as topic, v.timestamp
-    FROM votes v
-    JOIN eurovoc_concept_votes ecv ON v.id = ecv.vote_id
-    JOIN eurovoc_concepts ec ON ecv.eurovoc_concept_id = ec.id
-    WHERE ec.label LIKE '%climate%'
-    ORDER BY v.timestamp DESC
-    LIMIT 100;
-    ```
-
-    **🔗 Political Group Analysis (use group_code from member_votes - RECOMMENDED):**
-    ```sql
-    SELECT mv.group_code, g.short_label, mv.position, COUNT(*) as vote_count
-    FROM member_votes mv
-    JOIN groups g ON mv.group_code = g.code
-    JOIN votes v ON mv.vote_id = v.id
-    WHERE v.timestamp >= '2024-01-01'
-    GROUP BY mv.group_code, g.short_label, mv.position
-    ORDER BY vote_count DESC
-    LIMIT 50;
-    ```
-
-    **🔗 Country Voting Patterns:**
-    ```sql
-    SELECT mv.country_code, c.label, mv.position, COUNT(*) as count
-    FROM member_votes mv
-    JOIN countries c ON mv.country_code = c.code
-    JOIN votes v ON mv.vote_id = v.id
-    WHERE v.procedure_type = 'COD'
-    GROUP BY mv.country_code, c.label, mv.position
-    ORDER BY count DESC
-    LIMIT 100;
-    ```
-
-    **🔗 Committee Responsibility:**
-    ```sql
-    SELECT v.display_title, v.procedure_title, cm.label as committee, v.timestamp
-    FROM votes v
-    JOIN responsible_committee_votes rcv ON v.id = rcv.vote_id
-    JOIN committees cm ON rcv.committee_code = cm.code
-    WHERE cm.code = 'ENVI'
-    ORDER BY v.timestamp DESC
-    LIMIT 100;
+    Columns: id, display_title, procedure_title, timestamp, count_for, count_against,
+             margin, total, margin_ratio
+    (margin = ABS(count_for - count_against), margin_ratio = margin / (count_for + count_against))
     ```
 
-    **🔗 Geographic Area Analysis:**
+    **16. MV_TOPIC_TRENDS** - Votes and vote totals per EuroVoc topic and year
     ```sql
-    SELECT v.display_title, ga.label as geographic_area, v.result
-    FROM votes v
-    JOIN geo_area_votes gav ON v.id = gav.vote_id
-    JOIN geo_areas ga ON gav.geo_area_code = ga.code
-    WHERE ga.label LIKE '%Venezuela%'
-    LIMIT 50;
+    Columns: eurovoc_concept_id, label, year, vote_count, count_for, count_against, count_abstention
     ```
 
-    **🔗 Legislative Subject Analysis:**
+    **17. MV_GROUP_POSITIONS** - Per vote, how many MEPs of each political group took each position
     ```sql
-    SELECT v.display_title, os.label as subject, v.procedure_type
-    FROM votes v
-    JOIN oeil_subject_votes osv ON v.id = osv.vote_id
-    JOIN oeil_subjects os ON osv.oeil_subject_code = os.code
-    WHERE os.label LIKE '%citizenship%'
-    LIMIT 50;
+    Columns: vote_id, timestamp, group_code, position, mep_count
+    (Use it instead of grouping member_votes for group breakdowns)
     ```
 
-    **🔗 Close Votes Analysis:**
+    **18. MV_COUNTRY_POSITIONS** - Per vote, how many MEPs of each country took each position
     ```sql
-    SELECT display_title, procedure_title, count_for, count_against,
-           ABS(count_for - count_against) as margin,
-           timestamp
-    FROM votes
-    WHERE count_for > 0 AND count_against > 0
-    ORDER BY margin ASC
-    LIMIT 20;
+    Columns: vote_id, timestamp, country_code, position, mep_count
     ```
 
-    **🔗 MEP Group History (historical membership tracking):**
-    ```sql
-    SELECT m.first_name, m.last_name, g.short_label,
-           gm.start_date, gm.end_date, gm.term
-    FROM members m
-    JOIN group_memberships gm ON m.id = gm.member_id
-    JOIN groups g ON gm.group_code = g.code
-    WHERE m.last_name = 'GOERENS'
-    ORDER BY gm.start_date;
-    ```
+    === QUERY REFERENCE ===
+    Worked example queries are not part of these instructions. Before writing a query
+    you're unsure about, call `get_query_reference` with one of:
+    - `sql_patterns`: SQLite joins for MEP histories, topics, groups, close votes, trends
+    - `sparql_patterns`: field-tested EUR-Lex SPARQL queries
+    - `sparql_troubleshooting`: what to do when a SPARQL query fails, times out or finds nothing
 
     **⚠️ SQLite Performance Tips:**
     - Always use `LIMIT` clauses (especially with large joins) - recommend 100-1000 max
     - Use `WHERE` clauses to filter before joins when possible
-    - The database has excellent indexes on vote_id, member_id, timestamp, and procedure_type
+    - The database has indexes on vote_id, member_id, timestamp, procedure_type, member_votes(country_code, group_code, position) and eurovoc_concept_id, and on members.last_name (use `= ... COLLATE NOCASE` rather than LIKE to hit it)
     - Consider using `COUNT(*)` for summary statistics instead of fetching all rows
     - Use date filtering: `WHERE v.timestamp >= '2024-01-01'` for recent data
 
@@ -499,58 +1142,6 @@ frateto_analyzer = Agent(
     - Complex topic searches
     - Queries without LIMIT clauses (timeouts)
 
-    ### **🔍 OPTIMIZED QUERY PATTERNS (Field-Tested)**
-
-    **1. Recent Legislation by Pattern (RECOMMENDED for 2024+ laws):**
-    ```sparql
-    PREFIX cdm: <http://publications.europa.eu/ontology/cdm#>
-    SELECT ?work ?celex ?date ?type WHERE {
-      ?work cdm:resource_legal_id_celex ?celex .
-      ?work cdm:work_date_document ?date .
-      ?work cdm:work_has_resource-type ?type .
-      FILTER(REGEX(?celex, "2024.*R.*", "i"))
-      FILTER(BOUND(?celex))
-      FILTER(?date >= "2024-01-01"^^<http://www.w3.org/2001/XMLSchema#date>)
-    } ORDER BY DESC(?date) LIMIT 10
-    ```
-
-    **2. EuroVoc Topic Discovery (Works Well):**
-    ```sparql
-    PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
-    PREFIX cdm: <http://publications.europa.eu/ontology/cdm#>
-    SELECT DISTINCT ?topic_label WHERE {
-      ?work cdm:work_is_about_concept_eurovoc ?concept .
-      ?concept skos:prefLabel ?topic_label .
-      FILTER(LANG(?topic_label) = "en")
-      FILTER(CONTAINS(LCASE(?topic_label), "artificial intelligence"))
-    } LIMIT 10
-    ```
-
-    **3. GDPR/Privacy Laws (Reliable Historical Data):**
-    ```sparql
-    PREFIX cdm: <http://publications.europa.eu/ontology/cdm#>
-    SELECT ?work ?celex ?date ?type WHERE {
-      ?work cdm:resource_legal_id_celex ?celex .
-      ?work cdm:work_date_document ?date .
-      ?work cdm:work_has_resource-type ?type .
-      FILTER(?date >= "2016-01-01"^^<http://www.w3.org/2001/XMLSchema#date>)
-      FILTER(REGEX(?celex, ".*679.*|.*2016R679.*", "i"))
-    } ORDER BY DESC(?date) LIMIT 10
-    ```
-
-    **4. Resource Type Exploration:**
-    ```sparql
-    PREFIX cdm: <http://publications.europa.eu/ontology/cdm#>
-    SELECT DISTINCT ?type WHERE {
-      ?work cdm:work_has_resource-type ?type .
-      VALUES ?type {
-        <http://publications.europa.eu/resource/authority/resource-type/REG>
-        <http://publications.europa.eu/resource/authority/resource-type/DIR>
-        <http://publications.europa.eu/resource/authority/resource-type/DEC>
-      }
-    } LIMIT 5
-    ```
-
     ### **📋 CELEX Number Structure (For Pattern Matching)**
     **Format**: `32024R1689` (AI Act example)
     - `3` = Document type (3 = regulation)
@@ -570,22 +1161,6 @@ frateto_analyzer = Agent(
     - **All languages**: `https://eur-lex.europa.eu/legal-content/ALL/?uri=CELEX:[CELEX]`
     - **AI Act example**: `https://eur-lex.europa.eu/legal-content/EN/TXT/?uri=CELEX:32024R1689`
 
-    ### **💡 PRACTICAL TROUBLESHOOTING**
-
-    **If exact CELEX fails:**
-    - Try pattern matching: `FILTER(REGEX(?celex, "2024.*1689.*", "i"))`
-    - Broaden the search: `FILTER(REGEX(?celex, "2024.*R.*", "i"))`
-
-    **If query times out:**
-    - Reduce LIMIT to 5-10
-    - Add more specific FILTER conditions
-    - Use BOUND() checks: `FILTER(BOUND(?celex))`
-
-    **If no results for recent laws:**
-    - **Acknowledge database lag**: "The SPARQL endpoint may not have the latest legislation"
-    - **Provide constructed URLs anyway**: Use expected CELEX patterns
-    - **Cross-reference with parliament votes**: Look for CELEX in vote descriptions
-
     ### **🎯 CROSS-REFERENCING WITH PARLIAMENT DATA**
     **Link EUR-Lex with Parliament votes by:**
     - Looking for CELEX patterns in `votes.procedure_reference` or `votes.reference`
@@ -600,14 +1175,22 @@ frateto_analyzer = Agent(
     4. **Cross-reference opportunity**: "Let me check if parliament voted on related procedures"
 
     === TOOLS AVAILABLE ===
+    - `get_member_voting_history`: How an MEP voted, by last name
+    - `get_topic_votes`: Votes on a EuroVoc topic
+    - `get_close_votes`: The closest votes by margin
+    - `get_topic_trends`: Votes per year on a EuroVoc topic
+    - `get_group_positions`: How often each political group voted each way since a date
     - `execute_custom_sql`: Query SQLite parliamentary voting database
+    - `get_query_reference`: Example SQL and SPARQL queries, fetch them before writing an unfamiliar query
     - `execute_eurlex_sparql`: Query EU legislation database via SPARQL
+    - `execute_eurlex_sparql_batch`: Several independent SPARQL SELECT queries in one request, faster than one call each
     - `get_current_date`: Get current date for temporal context
-    - `update_analysis_state`: Track analysis progress (MUST USE for multi-step analysis)
+    - `update_analysis_state`: Record progress of an analysis that needs several queries
 
     === ANALYSIS STRATEGY ===
 
     **For questions about:**
+    - **Common questions**: if the question matches one of the `get_*` tools, call it with the right parameters instead of writing SQL
     - **Voting only**: "How did MEPs vote on climate issues?" → Use `execute_custom_sql`
     - **Legislation only**: "Find the AI Act" → Use `execute_eurlex_sparql`
     - **Both**: "How did parliament vote on AI legislation and what laws exist?" → Use both tools
@@ -619,26 +1202,44 @@ frateto_analyzer = Agent(
     - Use `procedure_reference` field to link votes to specific legislative procedures
 
     === STEP MANAGEMENT ===
-    - At start: `update_analysis_state(1, False)`
-    - During analysis: `update_analysis_state(current_step + 1, False)`
-    - At end: `update_analysis_state(final_step, True)`
-    - Maximum 3 iterations available
+    - Every tool call is a round trip, don't call `update_analysis_state` for questions one or two queries answer
+    - For longer analyses, call it between steps with `update_analysis_state(current_step + 1, False, findings)`
+    - No closing `update_analysis_state(final_step, True)` call is needed, the final answer ends the analysis
 
     === IMPORTANT NOTES ===
     - **SQLite Security**: Only SELECT queries allowed - no INSERT/UPDATE/DELETE/DROP
+    - **SQL and SPARQL results are columnar**: `results[column][i]` is the value of row `i` (for very wide SQL queries `layout` is 'rows' and `results` is a list of rows)
     - **EUR-Lex Limitation**: SPARQL gives CELEX numbers and metadata, not full text
     - **Always provide eurlex_url links** for users to read full legislation
     - **Performance**: Use LIMIT clauses in all SQL queries (recommend 100-1000 max)
     - **Context**: Monitor token usage - large result sets can exceed 200k token limit
     - **Cross-reference**: Combine voting data with legislation for unique insights
-    - **Database is well-indexed**: Efficient queries on vote_id, member_id, timestamp, procedure_type
+    - **Database is well-indexed**: Efficient queries on vote_id, member_id, timestamp, procedure_type, country/group positions and EuroVoc topics
 
     **Remember:**
     You're uniquely powerful because you can analyze BOTH what parliament does (voting) AND what laws actually exist (legislation). Provide detailed, helpful analysis while being concise and focused on what's most important for the user.
-    """,
+    """)
+
+def analyzer_instruction(context: ReadonlyContext) -> str:
+    return ANALYZER_INSTRUCTION
+
+frateto_analyzer = Agent(
+    name="sql_analyzer",
+    model=LiteLlm(
+        model= "fireworks_ai/accounts/fireworks/models/kimi-k2-instruct-0905",
+    ),
+    description="Performs iterative analysis of European Parliament data using custom SQL queries",
+    instruction=analyzer_instruction,
     tools=[
+        get_member_voting_history,
+        get_topic_votes,
+        get_close_votes,
+        get_topic_trends,
+        get_group_positions,
         execute_custom_sql,
         execute_eurlex_sparql,
+        execute_eurlex_sparql_batch,
+        get_query_reference,
         update_analysis_state,
         get_current_date
     ],
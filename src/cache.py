@@ -0,0 +1,73 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_PATH = os.path.expanduser(os.getenv("FRATETO_CACHE_PATH", "~/.frateto/cache.db"))
+# answers older than a day are asked again, the data gets new releases
+CACHE_TTL = 60 * 60 * 24
+CACHE_MEMORY_SIZE = 256
+
+
+def normalize_prompt(prompt: str) -> str:
+    # punctuation and casing don't change the question, "How did Germany vote?" == "how did germany vote"
+    return " ".join(re.sub(r"[^\w\s]", " ", prompt.lower()).split())
+
+
+class PromptCache:
+    """Streamed answers by prompt, an LRU in memory backed by a sqlite file.
+
+    Callers on the event loop run get and put in a worker thread, a lock keeps
+    the LRU and the connection to one thread at a time.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_size: int = CACHE_MEMORY_SIZE, ttl: int = CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._memory: OrderedDict[str, tuple[int, list[str]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, response BLOB, ts INTEGER)")
+
+    def get(self, prompt: str) -> list[str] | None:
+        key = normalize_prompt(prompt)
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                row = self._db.execute("SELECT ts, response FROM cache WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                entry = (row[0], json.loads(row[1]))
+
+            timestamp, chunks = entry
+            if timestamp + self.ttl < time.time():
+                self._memory.pop(key, None)
+                return None
+
+            self._remember(key, entry)
+            return chunks
+
+    def put(self, prompt: str, chunks: list[str]):
+        key = normalize_prompt(prompt)
+        entry = (int(time.time()), chunks)
+        response = json.dumps(chunks).encode()
+
+        with self._lock:
+            self._remember(key, entry)
+            with self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache (key, response, ts) VALUES (?, ?, ?)",
+                    (key, response, entry[0])
+                )
+
+    def _remember(self, key: str, entry: tuple[int, list[str]]):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
@@ -1,17 +1,50 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, StreamingResponse, HTMLResponse
+from fastapi.responses import FileResponse, StreamingResponse, HTMLResponse, Response
 from pydantic import BaseModel
+from collections import OrderedDict
 from datetime import datetime
+import asyncio
 import json
 import os
-import uuid
+import secrets
 
-from runner import run_agent
+try:
+    import orjson
+except ImportError:  # optional, only speeds up encoding the streamed messages
+    orjson = None
+
+from runner import MESSAGE_SEPARATOR, end_sessions, run_agent
 
 app = FastAPI(title="Frateto Chat API", version="1.0.0")
 
-active_sessions: dict[str, float] = {}
+# Last activity per user, least recently active first. Only touched from the event loop,
+# without an await in between, so it needs no lock
+active_sessions: OrderedDict[str, float] = OrderedDict()
+SESSION_TTL = 60 * 15
+
+# Streamed frames are sent together once this many bytes are waiting,
+# or FLUSH_INTERVAL seconds after the first one, token sized writes would cost a send each
+FLUSH_SIZE = 1024
+FLUSH_INTERVAL = 0.02
+
+# An answer is given up after ANSWER_TIMEOUT seconds in total, or MESSAGE_TIMEOUT seconds
+# without anything new from the agent, a stuck model or tool call would hold its slot forever
+ANSWER_TIMEOUT = 300
+MESSAGE_TIMEOUT = 120
+
+def to_json(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value).encode()
+
+# A streamed text message is 0:<json string>\n
+FRAME_PREFIX = b"0:"
+FRAME_SUFFIX = b"\n"
+# The finish message, only the completion token count changes between answers
+FINISH_PREFIX = b'd:{"finishReason":"stop","usage":{"promptTokens":10,"completionTokens":'
+FINISH_SUFFIX = b'}}\n'
+ERROR_FINISH = b'd:{"finishReason":"error","usage":{"promptTokens":0,"completionTokens":0}}\n'
 
 class ChatRequest(BaseModel):
     message: str
@@ -24,6 +57,25 @@ if os.path.exists("static"):
 else:
     print("⚠️  Static files not found. Run ./build.sh first!")
 
+# Vite names the built assets after their content, a file there never changes once built.
+# Stat them once per build, requests for them skip the filesystem probes and are cached by browsers
+ASSETS_DIR = "assets"
+ASSET_HEADERS = {"Cache-Control": "public, max-age=31536000, immutable"}
+built_assets: dict[str, os.stat_result] = {}
+
+def scan_built_assets():
+    """Index the built assets again, a rebuild deletes the old names and adds new ones."""
+    assets = {}
+    for root, _, files in os.walk(os.path.join("static", ASSETS_DIR)):
+        for name in files:
+            asset_path = os.path.join(root, name)
+            assets[os.path.relpath(asset_path, "static").replace(os.sep, "/")] = os.stat(asset_path)
+    # swapped whole, a request never sees half an index
+    global built_assets
+    built_assets = assets
+
+scan_built_assets()
+
 @app.get("/health")
 async def health():
     return {"status": "healthy"}
@@ -40,44 +92,144 @@ async def chat(request: ChatRequest):
 
     timestamp = datetime.now().timestamp()
     active_sessions[user_id] = timestamp
+    active_sessions.move_to_end(user_id)
 
     async def generate_stream():
         word_count = 0
+        frames: list[bytes] = []
+        frames_size = 0
+        flush_at = 0.0
+        loop = asyncio.get_running_loop()
+
+        # The agent runs in its own task and the frames are read off a queue,
+        # so waiting for the next one with a timeout never interrupts the agent
+        messages: asyncio.Queue[str | None] = asyncio.Queue()
+
+        async def produce():
+            try:
+                async for message in run_agent(session_id, user_id, user_message):
+                    messages.put_nowait(message)
+            finally:
+                messages.put_nowait(None)
+
+        producer = asyncio.create_task(produce())
+        answer_deadline = loop.time() + ANSWER_TIMEOUT
+        last_message_at = loop.time()
         try:
-            async for message in run_agent(session_id, user_id, user_message):
-                # add "\n\n" to separate messages in the frontend
-                escaped_message = json.dumps(message + "\n\n")
-                word_count += len(escaped_message.split())
-                yield f'0:{escaped_message}\n'
+            while True:
+                give_up_at = min(answer_deadline, last_message_at + MESSAGE_TIMEOUT)
+                wake_at = min(flush_at, give_up_at) if frames else give_up_at
+                try:
+                    message = await asyncio.wait_for(messages.get(), max(wake_at - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    if not frames:
+                        # the finally below cancels the agent
+                        raise TimeoutError("The answer took too long, please try again") from None
+                    yield b"".join(frames)
+                    frames.clear()
+                    frames_size = 0
+                    continue
+
+                if message is None:
+                    break
+                last_message_at = loop.time()
+
+                # the texts that queued up meanwhile go in the same frame, the client appends them anyway
+                texts = [message]
+                finished = False
+                while not messages.empty():
+                    message = messages.get_nowait()
+                    if message is None:
+                        finished = True
+                        break
+                    texts.append(message)
+
+                text = texts[0] if len(texts) == 1 else "".join(texts)
+                # the texts are token sized deltas: one word per space, plus the last word
+                # of each message, which ends with the separator
+                word_count += text.count(" ") + text.count(MESSAGE_SEPARATOR)
+                if not frames:
+                    flush_at = loop.time() + FLUSH_INTERVAL
+                frames.append(FRAME_PREFIX + to_json(text) + FRAME_SUFFIX)
+                frames_size += len(frames[-1])
+                if frames_size >= FLUSH_SIZE:
+                    yield b"".join(frames)
+                    frames.clear()
+                    frames_size = 0
+
+                if finished:
+                    break
+
+            # raises the agent's error, if it stopped on one
+            await producer
 
             print(f"session {session_id} mess {user_message} got an answer")
             # Send finish signal after all messages
-            yield f'd:{{"finishReason":"stop","usage":{{"promptTokens":10,"completionTokens":{word_count}}}}}\n'
+            frames.append(FINISH_PREFIX + str(word_count).encode() + FINISH_SUFFIX)
+            yield b"".join(frames)
 
         except Exception as e:
             print(f"Streaming error: {e}")
-            error_msg = json.dumps(f"Error: {str(e)}")
-            yield f'0:{error_msg}\n'
-            yield 'd:{{"finishReason":"error","usage":{{"promptTokens":0,"completionTokens":0}}}}\n'
+            if frames:
+                yield b"".join(frames)
+            yield FRAME_PREFIX + to_json(f"Error: {str(e)}") + FRAME_SUFFIX
+            yield ERROR_FINISH
+
+        finally:
+            # the client went away mid answer, stop the agent too
+            producer.cancel()
 
     return StreamingResponse(
         generate_stream(),
         media_type="text/plain",
-        headers={"X-Vercel-AI-Data-Stream": "v1"}
+        headers={
+            "X-Vercel-AI-Data-Stream": "v1",
+            # proxies in front of the app must pass the frames on as they come
+            "X-Accel-Buffering": "no",
+            "Cache-Control": "no-cache",
+        }
     )
 
+INDEX_PATH = "static/index.html"
+# (mtime, text before the session script, text after it), read again only when a build changes it
+_index_template: tuple[float, bytes, bytes] | None = None
+
+def index_template() -> tuple[bytes, bytes]:
+    global _index_template
+    mtime = os.stat(INDEX_PATH).st_mtime
+    if _index_template is None or _index_template[0] != mtime:
+        with open(INDEX_PATH, "r") as f:
+            html_content = f.read()
+
+        # Insert the script before closing </head> tag
+        split_at = html_content.find("</head>")
+        if split_at == -1:
+            # Fallback: insert at the beginning of <body>
+            split_at = html_content.find("<body>")
+            split_at = len(html_content) if split_at == -1 else split_at + len("<body>")
+        _index_template = (mtime, html_content[:split_at].encode(), html_content[split_at:].encode())
+        # a new index.html means a new build, its assets have new names
+        scan_built_assets()
+    return _index_template[1], _index_template[2]
+
+SESSION_SCRIPT_PREFIX = b"""
+        <script>
+            window.FRATETO_SESSION = '"""
+SESSION_SCRIPT_SUFFIX = b"""';
+        </script>
+        """
+
 @app.get("/")
 async def serve_index():
     """Serve the main React app."""
-    if not os.path.exists("static/index.html"):
+    if not os.path.exists(INDEX_PATH):
         raise HTTPException(status_code=404, detail="Frontend not built. Run ./build.sh first!")
 
-    # remove session is not active for 15 min
+    # remove session is not active for 15 min, the expired ones are all at the front
     now = datetime.now().timestamp()
-    to_delete = [user_id for user_id, stamp in active_sessions.items() if stamp + 60 * 15 < now]
-
-    for user_id in to_delete:
-        del active_sessions[user_id]
+    while active_sessions and next(iter(active_sessions.values())) + SESSION_TTL < now:
+        expired_user, _ = active_sessions.popitem(last=False)
+        await end_sessions(expired_user)
 
     # limit to 20 concurrent users
     if len(active_sessions) >= 20:
@@ -102,34 +254,27 @@ async def serve_index():
             }
         )
 
-    with open("static/index.html", "r") as f:
-        html_content = f.read()
-
-    user_id = str(uuid.uuid4())
-    timestamp = datetime.now().timestamp()
-    active_sessions[user_id] = timestamp
-
-    session_script = f"""
-        <script>
-            window.FRATETO_SESSION = '{user_id}';
-        </script>
-        """
+    head, tail = index_template()
 
-    # Insert the script before closing </head> tag
-    if "</head>" in html_content:
-        html_content = html_content.replace("</head>", f"{session_script}</head>")
-    else:
-        # Fallback: insert at the beginning of <body>
-        html_content = html_content.replace("<body>", f"<body>{session_script}")
+    # only needs to be unguessable, base64 of 16 random bytes is safe inside the JS string
+    user_id = secrets.token_urlsafe(16)
+    active_sessions[user_id] = now
 
-    return HTMLResponse(content=html_content)
+    return HTMLResponse(content=head + SESSION_SCRIPT_PREFIX + user_id.encode() + SESSION_SCRIPT_SUFFIX + tail)
 
 @app.get("/{path:path}")
-async def serve_frontend_routes(path: str):
+async def serve_frontend_routes(path: str, request: Request):
     """Catch-all route for React Router (SPA routing)."""
-    # Check if it's a static asset first
     static_file_path = f"static/{path}"
-    if os.path.exists(static_file_path) and os.path.isfile(static_file_path):
+    stat_result = built_assets.get(path)
+    if stat_result is not None:
+        response = FileResponse(static_file_path, stat_result=stat_result, headers=ASSET_HEADERS)
+        if request.headers.get("if-none-match") == response.headers["etag"]:
+            return Response(status_code=304, headers={"etag": response.headers["etag"], **ASSET_HEADERS})
+        return response
+
+    # Check if it's a static asset first
+    if os.path.isfile(static_file_path):
         return FileResponse(static_file_path)
 
     # Otherwise, serve index.html for React Router
@@ -142,4 +287,5 @@ async def serve_frontend_routes(path: str):
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # every request already prints its own line, the access log would add a write per request
+    uvicorn.run(app, host="0.0.0.0", port=port, access_log=False)
@@ -1,4 +1,11 @@
+import asyncio
+import os
+from contextlib import aclosing
+
 from agent.agent import root_agent
+from cache import PromptCache
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.events import Event
 from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
 from google.genai import types
@@ -7,37 +14,121 @@ APP_NAME = "frateto"
 
 session_service = InMemorySessionService()
 runner = Runner(agent=root_agent, session_service=session_service, app_name=APP_NAME)
+prompt_cache = PromptCache()
+# agent runs at once, more only pile up retries against the model API's rate limits
+MAX_IN_FLIGHT = int(os.getenv("FRATETO_MAX_IN_FLIGHT", 8))
+in_flight = asyncio.Semaphore(MAX_IN_FLIGHT)
+# user_id -> {session_id: its create_session task}, for the sessions in session_service.
+# A request for a session being created awaits the same task instead of creating it again
+known_sessions: dict[str, dict[str, asyncio.Task]] = {}
+# stream the model's text as it is generated instead of one event per complete message
+run_config = RunConfig(streaming_mode=StreamingMode.SSE)
+
+# added to separate messages in the frontend
+MESSAGE_SEPARATOR = "\n\n"
+
+# "*tool_name*" shown in place of each tool call, one per tool of the agent
+_function_markers: dict[str, str] = {}
+
+def function_marker(name: str) -> str:
+    marker = _function_markers.get(name)
+    if marker is None:
+        marker = _function_markers[name] = f"*{name}*"
+    return marker
+
+def text_content(role: str, text: str) -> types.Content:
+    """A one part text message, built without pydantic validation, the fields are plain strings."""
+    return types.Content.model_construct(role=role, parts=[types.Part.model_construct(text=text)])
+
+async def end_sessions(user_id: str):
+    """Forget an expired user's sessions, here and in session_service."""
+    for session_id in known_sessions.pop(user_id, {}):
+        await session_service.delete_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
 
 async def run_agent(session_id: str, user_id: str, user_message: str):
     """Simple function to run the agent and return the response"""
 
-    session = await session_service.get_session(
-        app_name=APP_NAME,
-        user_id=user_id,
-        session_id=session_id
-    )
-    if not session:
-        await session_service.create_session(
+    # only opening questions are cached, later answers depend on the conversation.
+    # A session seen before already holds the conversation so far
+    sessions = known_sessions.setdefault(user_id, {})
+    creation = sessions.get(session_id)
+    cacheable = creation is None
+    if cacheable:
+        # registered before the first await, a concurrent request finds it
+        creation = sessions[session_id] = asyncio.create_task(session_service.create_session(
             app_name=APP_NAME,
             user_id=user_id,
             session_id=session_id
-        )
+        ))
+    try:
+        # a finished task returns at once, without a trip through the event loop.
+        # Shielded, a request that goes away doesn't cancel the creation others wait on
+        session = await asyncio.shield(creation)
+    except Exception:
+        # not created, the next message tries again
+        if sessions.get(session_id) is creation:
+            del sessions[session_id]
+        raise
+
+    content = text_content('user', user_message)
+
+    if cacheable:
+        # the sqlite lookup runs off the event loop, other streams keep going meanwhile
+        cached = await asyncio.to_thread(prompt_cache.get, user_message)
+        if cached is not None:
+            # keep the exchange in the session so follow-up questions have context
+            await session_service.append_event(session, Event(author='user', content=content))
+            await session_service.append_event(session, Event(
+                author=root_agent.name,
+                content=text_content('model', cached[-1])
+            ))
+            for message in cached:
+                yield message + MESSAGE_SEPARATOR
+            return
 
-    content = types.Content(
-        role='user',
-        parts=[types.Part(text=user_message)]
-    )
+    # complete messages, for the cache; the text itself is yielded as the model writes it
+    messages = []
+    streamed = False
+    # waits here while MAX_IN_FLIGHT other answers are being generated
+    # aclosing stops the runner as soon as the final answer is in, rather than whenever
+    # the abandoned generator is collected
+    async with in_flight, aclosing(runner.run_async(
+        user_id=user_id, session_id=session_id, new_message=content, run_config=run_config
+    )) as events:
+        async for event in events:
+            # each field is read once, most events are streamed tokens
+            content = event.content
+            if not content:
+                continue
+            parts = content.parts
+            if not parts:
+                continue
+            part = parts[0]
+            text = part.text
 
-    async for event in runner.run_async(user_id=user_id, session_id=session_id, new_message=content):
-        if not event.is_final_response() and event.content:
+            if event.partial:
+                if text:
+                    streamed = True
+                    yield text
+                continue
+
+            final = event.is_final_response()
             # check if message is text for the user
-            if event.content and event.content.parts and event.content.parts[0].text:
-                yield event.content.parts[0].text
+            if text:
+                messages.append(text)
+                # the complete message repeats what was already streamed, only close it
+                yield MESSAGE_SEPARATOR if streamed else text + MESSAGE_SEPARATOR
+                streamed = False
             # check if message is a function call
-            elif event.content and event.content.parts and event.content.parts[0].function_response:
-                yield f"*{event.content.parts[0].function_response.name}*"
-        elif event.is_final_response() and event.content:
-            if event.content.parts and event.content.parts[0].text:
+            elif not final:
+                function_response = part.function_response
+                if function_response:
+                    marker = function_marker(function_response.name)
+                    messages.append(marker)
+                    yield marker + MESSAGE_SEPARATOR
+
+            if final and text:
                 # return the query text and finish conversation
-                yield event.content.parts[0].text
+                if cacheable:
+                    await asyncio.to_thread(prompt_cache.put, user_message, messages)
                 break